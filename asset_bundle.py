@@ -0,0 +1,298 @@
+import cPickle as pickle
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+from cStringIO import StringIO
+from procgame.dmd import Frame
+from procgame.game import Driver
+from weakref import WeakSet
+
+class AssetBundle(object):
+    """A binary cache of parsed assets (animations, fonts and lampshows) stored in a single file.
+       Each entry is keyed by the path of its source file and remembers the source's size, mtime and hash.
+       An entry is only used when its source file did not change, otherwise the caller parses the file again
+       and adds the result to the bundle with add(). save() writes the new entries back to disk.
+    """
+
+    magic = 'JD2ASSET'
+    version = 3
+    header_format = '<8sII' # magic, version, index length
+
+    def __init__(self, path, base_path, game):
+        self.path = path
+        self.base_path = base_path
+        self.game = game
+        self.index = {}
+        self.data_offset = 0
+        self.added = {}
+        self.index_changed = False
+        self.map = None
+        self.mapped_frames = WeakSet() # the MappedFrames reading from map
+        self.map_lock = threading.Lock() # the decode workers call load_mapped() concurrently
+        self.logger = logging.getLogger('game.assets')
+        self.read_index()
+
+    def read_index(self):
+        if not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                magic, version, index_length = struct.unpack(self.header_format, f.read(struct.calcsize(self.header_format)))
+                if magic == self.magic and version == self.version:
+                    self.index = pickle.loads(f.read(index_length))
+                    self.data_offset = f.tell()
+                else:
+                    self.logger.info('ignoring asset bundle %s with version %s', self.path, version)
+        except (IOError, struct.error, pickle.UnpicklingError, EOFError):
+            self.logger.warning('ignoring unreadable asset bundle %s', self.path)
+            self.index = {}
+
+    def key(self, path):
+        return os.path.relpath(path, self.base_path).replace('\\', '/')
+
+    def is_fresh(self, path):
+        entry = self.index.get(self.key(path))
+        if entry is None or not os.path.isfile(path):
+            return False
+        stat = os.stat(path)
+        if stat.st_size != entry['size']:
+            return False
+        if stat.st_mtime == entry['mtime']:
+            return True
+        # a copied or touched file has a new mtime but the same content, remember the mtime to skip the hash next time
+        if self.hash(path) == entry['hash']:
+            entry['mtime'] = stat.st_mtime
+            self.index_changed = True
+            return True
+        return False
+
+    def hash(self, path):
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def load(self, path):
+        """return the parsed asset for the source file at path, or None if the bundle has no fresh entry for it"""
+        if not self.is_fresh(path):
+            return None
+        return self.unpickle(self.read_blob(self.index[self.key(path)]))
+
+    def add(self, path, asset):
+        """add an asset that was parsed from the source file at path"""
+        stat = os.stat(path)
+        entry = {'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': self.hash(path)}
+        self.added[self.key(path)] = (entry, self.pickle(asset))
+
+    def contains(self, path):
+        return self.key(path) in self.added or self.is_fresh(path)
+
+    def changed(self):
+        return self.index_changed or len(self.added) > 0
+
+    def save(self):
+        """write the bundle with the entries added since it was read, keeping the previous entries that are still fresh"""
+        entries = []
+        for key, entry in self.index.items():
+            if key not in self.added and self.is_fresh(os.path.join(self.base_path, key)):
+                entries.append((key, dict(entry), self.read_blob(entry)))
+        for key, (entry, blob) in self.added.items():
+            entries.append((key, entry, blob))
+
+        index = {}
+        offset = 0
+        for key, entry, blob in entries:
+            entry['offset'] = offset
+            entry['length'] = len(blob)
+            index[key] = entry
+            offset += len(blob)
+
+        index_data = pickle.dumps(index, pickle.HIGHEST_PROTOCOL)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(struct.pack(self.header_format, self.magic, self.version, len(index_data)))
+            f.write(index_data)
+            for key, entry, blob in entries:
+                f.write(blob)
+        # an open mapping of the file prevents its removal on Windows
+        self.unmap(index)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(temp_path, self.path)
+
+        self.logger.info('saved asset bundle %s with %d entries (%d updated)', self.path, len(index), len(self.added))
+        self.index = index
+        self.data_offset = struct.calcsize(self.header_format) + len(index_data)
+        self.added = {}
+        self.index_changed = False
+        self.remap()
+
+    def read_blob(self, entry):
+        # open the file on every read, the worker threads of the asset loader read concurrently
+        with open(self.path, 'rb') as f:
+            f.seek(self.data_offset + entry['offset'])
+            return f.read(entry['length'])
+
+    #
+    # Frames and game objects are not picklable, they are saved by reference.
+    # An entry is the pickled asset followed by the dots of all its frames,
+    # this keeps the dots at a known offset in the file so they can be memory-mapped.
+    #
+
+    def pickle(self, asset):
+        dots = []
+        dots_length = [0]
+        def persistent_id(obj):
+            if isinstance(obj, Frame):
+                data = obj.get_data()
+                dots.append(data)
+                dots_length[0] += len(data)
+                return ('frame', obj.width, obj.height, dots_length[0] - len(data))
+            return self.persistent_id(obj)
+
+        f = StringIO()
+        pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = persistent_id
+        pickler.dump(asset)
+        data = f.getvalue()
+        return struct.pack('<I', len(data)) + data + ''.join(dots)
+
+    def unpickle(self, blob):
+        dots_start = 4 + struct.unpack('<I', blob[:4])[0]
+        def persistent_load(pid):
+            if pid[0] == 'frame':
+                width, height, offset = pid[1:]
+                frame = Frame(width, height)
+                frame.set_data(blob[dots_start + offset:dots_start + offset + width * height])
+                return frame
+            return self.persistent_load(pid)
+
+        unpickler = pickle.Unpickler(StringIO(blob[4:dots_start]))
+        unpickler.persistent_load = persistent_load
+        return unpickler.load()
+
+    def persistent_id(self, obj):
+        if isinstance(obj, Driver):
+            return ('driver', obj.name)
+        elif isinstance(obj, logging.Logger):
+            return ('logger', obj.name)
+        elif obj is self.game:
+            return ('game',)
+        return None
+
+    def persistent_load(self, pid):
+        if pid[0] == 'driver':
+            name = pid[1]
+            return self.game.lamps[name] if self.game.lamps.has_key(name) else self.game.coils[name]
+        elif pid[0] == 'logger':
+            return logging.getLogger(pid[1])
+        elif pid[0] == 'game':
+            return self.game
+        raise pickle.UnpicklingError('unsupported persistent id ' + str(pid[0]))
+
+    #
+    # Memory-mapped animations
+    #
+
+    def load_mapped(self, path):
+        """return the animation for the source file at path with its frames left in the memory-mapped bundle,
+           or None if the bundle has no fresh entry for it
+        """
+        if not self.is_fresh(path):
+            return None
+        with self.map_lock:
+            # only the first worker opens the map, a second map would never be unmapped or rebased
+            if self.map is None:
+                self.map = self.open_map()
+            mapping = self.map
+
+        key = self.key(path)
+        start = self.data_offset + self.index[key]['offset']
+        dots_offset = 4 + struct.unpack('<I', mapping[start:start + 4])[0]
+        refs = []
+        def persistent_load(pid):
+            if pid[0] == 'frame':
+                width, height, offset = pid[1:]
+                refs.append((dots_offset + offset, width, height))
+                return None
+            return self.persistent_load(pid)
+
+        unpickler = pickle.Unpickler(StringIO(mapping[start + 4:start + dots_offset]))
+        unpickler.persistent_load = persistent_load
+        anim = unpickler.load()
+        anim.frames = MappedFrames(mapping, key, start, refs)
+        with self.map_lock:
+            self.mapped_frames.add(anim.frames)
+        return anim
+
+    def open_map(self):
+        with open(self.path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def unmap(self, index):
+        """close the map before the file is replaced by a bundle with the given index.
+           The frames of an entry left out of the new bundle, or replaced in it, are copied to memory
+           and no longer follow the file.
+        """
+        if self.map is None:
+            return
+        for frames in list(self.mapped_frames):
+            if frames.key not in index or frames.key in self.added:
+                length = self.index[frames.key]['length']
+                frames.rebase(self.map[frames.start:frames.start + length], 0)
+                self.mapped_frames.discard(frames)
+        self.map.close()
+        self.map = None
+
+    def remap(self):
+        """map the new file and move the mapped frames to their offsets in it"""
+        moved = [frames for frames in self.mapped_frames if isinstance(frames.mapping, mmap.mmap)]
+        if moved:
+            self.map = self.open_map()
+            for frames in moved:
+                frames.rebase(self.map, self.data_offset + self.index[frames.key]['offset'])
+
+
+class MappedFrames(object):
+    """A read-only sequence of frames whose dots stay in a memory-mapped file shared through the page cache.
+       The Frame is built when it is accessed. The last one is kept since an animation shows each frame for a few ticks.
+    """
+
+    def __init__(self, mapping, key, start, refs):
+        self.mapping = mapping
+        self.key = key # the bundle entry holding the dots
+        self.start = start # offset of the entry in mapping
+        self.refs = refs # (offset in the entry, width, height)
+        self.last_index = None
+        self.last_frame = None
+
+    def rebase(self, mapping, start):
+        """read the dots from another copy of the entry"""
+        self.mapping = mapping
+        self.start = start
+
+    def copied_size(self):
+        """the bytes held in memory, the copy of the last frame accessed"""
+        return max(width * height for offset, width, height in self.refs) if self.refs else 0
+
+    def __len__(self):
+        return len(self.refs)
+
+    def __iter__(self):
+        for index in range(len(self.refs)):
+            yield self[index]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self.refs)))]
+        if index < 0:
+            index += len(self.refs)
+        if index != self.last_index:
+            offset, width, height = self.refs[index]
+            offset += self.start
+            frame = Frame(width, height)
+            frame.set_data(self.mapping[offset:offset + width * height])
+            self.last_index = index
+            self.last_frame = frame
+        return self.last_frame
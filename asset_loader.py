@@ -1,336 +1,364 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from multiprocessing.pool import ThreadPool
+from Queue import Empty, Queue
+import pygame
+import yaml
+from procgame.config import value_for_key_path
 from procgame.dmd import Animation, AnimatedLayer, font_named
+from procgame.lamps import LampShow
+from asset_bundle import AssetBundle, MappedFrames
+from fonts import AtlasFont
+from sounds import SoundCache
+from startup_profiler import profiler
+
+def load_manifest(curr_file_path):
+    """return the asset definitions in config/assets.yaml and the directory prefix of each asset type"""
+    with open(curr_file_path + '/config/assets.yaml') as f:
+        manifest = yaml.safe_load(f)
+
+    assets_path = curr_file_path + '/assets'
+    prefixes = {
+        'animations': assets_path + '/dmd/',
+        'fonts': assets_path + '/fonts/',
+        'lampshows': assets_path + '/lamps/',
+        'music': assets_path + '/sound/music/',
+        'effects': assets_path + '/sound/sfx/',
+        'voice': assets_path + '/sound/voice/',
+    }
+    return manifest, prefixes
+
+def index_sounds(manifest, prefixes):
+    """return the tier and path of the sound effects and voice clips of each key in the manifest"""
+    sounds = {}
+    for asset_type in ['effects', 'voice']:
+        for asset in manifest.get(asset_type) or []:
+            sounds.setdefault(asset['key'], []).append((asset.get('tier', 'deferred'), prefixes[asset_type] + asset['file']))
+    return sounds
+
+
+class AnimationStore(object):
+    """A mapping of animation layers loaded on first access.
+       Loaded animations are kept in a LRU bounded by a memory budget in bytes, pinned animations are never evicted.
+       An evicted animation is loaded again the next time it is accessed.
+    """
+
+    def __init__(self, budget, decode):
+        self.budget = budget
+        self.decode = decode
+        self.assets = {}
+        self.layers = OrderedDict() # least recently used first
+        self.sizes = {}
+        self.memory = 0
+        self.logger = logging.getLogger('game.assets')
+
+    def register(self, asset, path):
+        self.assets[asset['key']] = (asset, path)
+
+    def add(self, key, anim):
+        """Add an animation that was already decoded"""
+        asset = self.assets[key][0]
+        layer = AnimatedLayer(frames=anim.frames, repeat=asset.get('repeat', False), hold=asset.get('holdLastFrame', False), frame_time=asset.get('frame_time', 1))
+        composite_op = asset.get('composite_op')
+        if composite_op:
+            layer.composite_op = composite_op
+
+        self.discard(key)
+        self.layers[key] = layer
+        # the dots of memory-mapped frames live in the page cache, only the frame copied on access is in our memory
+        self.sizes[key] = anim.frames.copied_size() if isinstance(anim.frames, MappedFrames) else sum(frame.width * frame.height for frame in anim.frames)
+        self.memory += self.sizes[key]
+        self.evict(keep=key)
+        return layer
+
+    def load(self, key):
+        path = self.assets[key][1]
+        self.logger.info('loading animation %s', key)
+        return self.add(key, self.decode(path))
+
+    def discard(self, key):
+        if key in self.layers:
+            del self.layers[key]
+            self.memory -= self.sizes.pop(key)
+
+    def evict(self, keep):
+        for key in list(self.layers.keys()):
+            if self.memory <= self.budget:
+                break
+            if key != keep and not self.assets[key][0].get('pinned'):
+                self.logger.info('evicting animation %s', key)
+                self.discard(key)
+
+    def is_loaded(self, key):
+        return key in self.layers
+
+    def __getitem__(self, key):
+        layer = self.layers.pop(key, None)
+        if layer is None:
+            if key not in self.assets:
+                raise KeyError(key)
+            return self.load(key)
+        self.layers[key] = layer # most recently used
+        return layer
+
+    def __contains__(self, key):
+        return key in self.assets
+
+    def __len__(self):
+        return len(self.assets)
+
+    def __iter__(self):
+        return iter(self.assets)
+
+    def keys(self):
+        return self.assets.keys()
+
+    def get(self, key, default=None):
+        return self[key] if key in self.assets else default
+
 
 class AssetLoader(object):
-    """An asset manager inspired by SkeletonGame.AssetManager"""
+    """An asset manager inspired by SkeletonGame.AssetManager.
+       The assets are listed in config/assets.yaml, each one belongs to a tier loaded in this order.
+    """
+
+    tiers = ['boot', 'game', 'deferred']
 
     def __init__(self, game):
         self.game = game
-        self.animations = {}
+        self.animations = AnimationStore(value_for_key_path('animation_memory_budget', 4 * 1024 * 1024), self.decode_animation)
         self.fonts = {}
+        self.sound_cache = SoundCache(self.decode_sound)
+        self.load_times = {}
+        self.ready_tiers = set()
+        self.failed_tiers = set()
+        self.pending = Queue() # (tier, commits) decoded by the warm-up thread
+        self.sound_tiers = {} # key -> [(tier, path)] of the sound effects and voice clips
+        self.early_sounds = set() # keys played before their tier was committed
+        self.bundle = None
+        self.map_animations = value_for_key_path('animation_storage', 'memory') == 'mmap'
+        self.logger = logging.getLogger('game.assets')
 
     def load_assets(self, curr_file_path):
+        """load the boot tier of the asset manifest, the other tiers are decoded in the background.
+           The assets decoded in the background are committed to the game by commit_pending() on the main thread.
+        """
+        self.manifest, self.prefixes = load_manifest(curr_file_path)
+        self.sound_tiers = index_sounds(self.manifest, self.prefixes)
+
+        # all animations can be loaded on first access, the tiers only decide which ones are warmed up
+        for asset in self.manifest['animations']:
+            self.animations.register(asset, self.prefixes['animations'] + asset['file'])
+
+        if value_for_key_path('use_asset_bundle', True):
+            self.bundle = AssetBundle(curr_file_path + '/assets.bundle', curr_file_path, self.game)
+
+        self.start_time = time.time()
+        self.pool = ThreadPool(max(1, value_for_key_path('asset_loader_threads', 4)))
+        self.commit('boot', self.decode_tier('boot'))
+
+        self.warm_up_thread = threading.Thread(target=self.warm_up, name='asset warm-up')
+        self.warm_up_thread.daemon = True
+        self.warm_up_thread.start()
+
+    def warm_up(self):
+        """decode the remaining tiers on the worker pool, runs on the warm-up thread"""
+        try:
+            for tier in self.tiers[1:]:
+                try:
+                    commits = self.decode_tier(tier)
+                    if tier == self.tiers[-1] and self.bundle:
+                        # the bundle is written on the main thread since it also reads from it
+                        self.add_missing_to_bundle()
+                        commits.append(self.save_bundle)
+                except Exception:
+                    self.logger.exception('cannot load the %s assets', tier)
+                    commits = [partial(self.raise_error, tier)]
+                self.pending.put((tier, commits))
+        finally:
+            self.pool.close()
+            self.pool.join()
+
+    def decode_tier(self, tier):
+        """decode the assets of a tier on the worker pool and wait for them.
+           Return the functions that commit them to the game, they must be called on the main thread.
+        """
+        def in_tier(asset_type):
+            return [(asset, self.prefixes[asset_type] + asset['file'])
+                    for asset in self.manifest.get(asset_type) or [] if asset.get('tier', 'deferred') == tier]
+
+        # warming up the deferred animations would only push the others out of the memory budget
+        animations = in_tier('animations') if tier != 'deferred' else []
+        fonts = in_tier('fonts')
+        lampshows = in_tier('lampshows')
+        music = in_tier('music')
+        if self.game.sound.lazy_voice:
+            # the voice clips are decoded when they are first played
+            sounds = in_tier('effects')
+            lazy_sounds = in_tier('voice')
+        else:
+            sounds = in_tier('effects') + in_tier('voice')
+            lazy_sounds = []
+
+        pending_animations = self.pool.map_async(self.timed(self.decode_animation), [path for asset, path in animations])
+        pending_fonts = self.pool.map_async(self.timed(self.decode_font), [path for asset, path in fonts])
+        pending_shows = self.pool.map_async(self.timed(self.decode_show), [path for asset, path in lampshows])
+        # a file registered under several keys is decoded once
+        sound_paths = OrderedDict((self.sound_cache.real_path(path), path) for asset, path in sounds).values()
+        pending_sounds = self.pool.map_async(self.timed(self.sound_cache.load), sound_paths)
+
+        # the commits are in manifest order so the outcome is deterministic
+        commits = []
+        for (asset, path), anim in zip(animations, self.results(tier, 'animations', pending_animations)):
+            commits.append(partial(self.add_animation, asset['key'], anim))
+        for (asset, path), font in zip(fonts, self.results(tier, 'fonts', pending_fonts)):
+            commits.append(partial(self.fonts.__setitem__, asset['key'], font))
+        for (asset, path), show in zip(lampshows, self.results(tier, 'lampshows', pending_shows)):
+            commits.append(partial(self.game.lampctrl.shows.__setitem__, asset['key'], show))
+        for asset, path in music:
+            commits.append(partial(self.game.sound.register_music, asset['key'], path))
+        self.results(tier, 'sounds', pending_sounds)
+        for asset, path in sounds:
+            commits.append(partial(self.commit_sound, self.game.sound.register_shared_sound, asset['key'], path, self.sound_cache.share(asset['key'], path)))
+        for asset, path in lazy_sounds:
+            commits.append(partial(self.commit_sound, self.game.sound.register_lazy_sound, asset['key'], path))
+        return commits
+
+    def commit_sound(self, register, key, *args):
+        # a key played before its tier was committed is already registered
+        if key not in self.early_sounds:
+            register(key, *args)
+
+    def register_early_sound(self, key):
+        """register the sound effects or voice clips of key when their tier is not committed yet, called from the main loop.
+           They are decoded when first played, the warm-up thread keeps them out of its commit.
+           Return True if the key was found in a pending tier.
+        """
+        if key in self.early_sounds or len(self.ready_tiers) == len(self.tiers):
+            return False
+        paths = [path for tier, path in self.sound_tiers.get(key, []) if tier not in self.ready_tiers]
+        if not paths:
+            return False
+        self.logger.info('sound %s played before its tier is loaded, decoding it now', key)
+        self.early_sounds.add(key)
+        for path in paths:
+            self.game.sound.register_lazy_sound(key, path)
+        return True
+
+    def commit(self, tier, commits):
+        for commit in commits:
+            commit()
+        self.ready_tiers.add(tier)
+        self.load_times[tier] = time.time() - self.start_time
+        self.logger.info('%s tier ready after %.3fs', tier, self.load_times[tier])
+        self.sound_cache.log_stats()
+
+    def commit_pending(self):
+        """commit the assets decoded in the background since the last call, called from the main loop.
+           A tier that cannot be committed is logged, wait_for_tier() raises the error if the tier is needed.
+        """
+        while True:
+            try:
+                tier, commits = self.pending.get_nowait()
+            except Empty:
+                return
+            self.try_commit(tier, commits)
+
+    def wait_for_tier(self, tier):
+        """block until the assets of the given tier are decoded and commit them"""
+        if tier not in self.tiers:
+            raise ValueError('unknown asset tier ' + tier)
+        while tier not in self.ready_tiers:
+            if tier in self.failed_tiers:
+                self.raise_error(tier)
+            # the tier taken from the queue may be another one, it must be marked failed too or a later wait blocks
+            self.try_commit(*self.pending.get())
+
+    def try_commit(self, tier, commits):
+        """commit the assets of the tier, log the error and mark the tier failed if they cannot be committed"""
+        try:
+            self.commit(tier, commits)
+        except Exception:
+            self.logger.exception('cannot commit the %s assets', tier)
+            self.failed_tiers.add(tier)
+
+    def raise_error(self, tier):
+        raise RuntimeError('cannot load the %s assets, see the log for details' % tier)
+
+    def timed(self, decode):
+        """return a function that calls decode and also returns how long it took"""
+        def run(arg):
+            decode_start = time.time()
+            return decode(arg), time.time() - decode_start
+        return run
+
+    def results(self, tier, asset_type, pending):
+        """wait for the results of a map_async call on timed decode functions, log the load time and return the decoded assets"""
+        with profiler.section(tier + ' ' + asset_type):
+            results = pending.get()
+        # wall-clock time since the start of the loading, plus the time spent decoding on the workers
+        elapsed = time.time() - self.start_time
+        decode_time = sum(decode_time for unused, decode_time in results)
+        self.load_times[tier + ' ' + asset_type] = elapsed
+        self.logger.info('%s %s: %d assets ready after %.3fs (decode time %.3fs)', tier, asset_type, len(results), elapsed, decode_time)
+        return [asset for asset, unused in results]
+
+    def add_animation(self, key, anim):
+        # the animation might have been loaded on first access before it was warmed up
+        if not self.animations.is_loaded(key):
+            self.animations.add(key, anim)
+
+    def parse_cached(self, path, parse):
+        """return the asset from the bundle when it is fresh, otherwise parse the source file and add it to the bundle"""
+        if self.bundle is None or not os.path.isfile(path):
+            return parse(path)
+        asset = self.bundle.load(path)
+        if asset is None:
+            asset = parse(path)
+            self.bundle.add(path, asset)
+        return asset
+
+    def add_missing_to_bundle(self):
+        # also parse the animations not warmed up, so the next boot finds all of them in the bundle
+        for key in self.animations.keys():
+            path = self.animations.assets[key][1]
+            if os.path.isfile(path) and not self.bundle.contains(path):
+                self.bundle.add(path, Animation().load(path))
+
+    def save_bundle(self):
+        if not self.bundle.changed():
+            return
+        try:
+            self.bundle.save()
+        except (IOError, OSError) as e:
+            self.logger.warning('cannot save asset bundle: %s', e)
+
+    def decode_animation(self, path):
+        if self.map_animations and self.bundle:
+            anim = self.bundle.load_mapped(path)
+            if anim is not None:
+                return anim
+        return self.parse_cached(path, lambda path: Animation().load(path))
+
+    def decode_font(self, path):
+        # the bundle holds the prebaked glyph atlas
+        return self.parse_cached(path, lambda path: AtlasFont(font_named(os.path.basename(path))))
+
+    def decode_show(self, path):
+        """mimic LampController.register_show, going through the bundle"""
+        return self.parse_cached(path, self.parse_show)
+
+    def parse_show(self, path):
+        show = LampShow(self.game)
+        show.load(path)
+        return show
 
-        animations_files = [
-            {'key': 'cityscape', 'file': 'cityscape.dmd', 'repeat':True, 'frame_time':2},
-            {'key': 'Splash', 'file': 'Splash.dmd', 'holdLastFrame':True, 'frame_time':1},
-            {'key': 'darkjudges', 'file': 'darkjudges.dmd', 'repeat':True, 'frame_time':4},
-            {'key': 'longwalk', 'file': 'longwalk.dmd', 'frame_time':7},
-            {'key': 'blackout', 'file': 'blackout.dmd', 'frame_time':3},
-            {'key': 'dredd_shoot_at_sniper', 'file': 'dredd_shoot_at_sniper.dmd', 'frame_time':5},
-            {'key': 'blockwars', 'file': 'blockwars.dmd', 'repeat':True, 'frame_time':3},
-            {'key': 'jdpeople', 'file': 'jdpeople.dmd', 'frame_time':1},
-            {'key': 'cows', 'file': 'cows.dmd', 'frame_time':1},
-            {'key': 'scopeandshot', 'file': 'scopeandshot.dmd', 'frame_time':1},
-            {'key': 'gun_powerup', 'file': 'gun_powerup.dmd', 'holdLastFrame':True, 'composite_op':'blacksrc', 'frame_time':7},
-            {'key': 'bike_across_screen', 'file': 'bike_across_screen.dmd', 'frame_time':3},
-            {'key': 'bikeacrosscity', 'file': 'bikeacrosscity.dmd', 'frame_time':5},
-            {'key': 'extra ball', 'file': 'extra_ball.dmd', 'frame_time':1}
-        ]
-
-        lampshow_files = [
-            {'key': 'advance_level', 'file': 'crimescene_advance_level.lampshow'},
-            {'key': 'attract0', 'file': 'attract_show_horiz.lampshow'},
-            {'key': 'attract1', 'file': 'attract_show_vert.lampshow'},
-            {'key': 'jackpot', 'file': 'jackpot.lampshow'},
-            {'key': 'shot_hit', 'file': 'flashers_only.lampshow'},
-        ]
-
-        music_files = [
-            {'key': 'background', 'file': 'brainsDarkMelody(161).aif'},
-            {'key': 'ball_launch', 'file': 'introloop(161).aif'},
-            {'key': 'mode', 'file': '40 Second guitar solo.aif'},
-            {'key': 'mode', 'file': '55 second loopable -- Sonya.aif'},
-            {'key': 'mode', 'file': '105 second loopable -- Sisyphus.aif'},
-            {'key': 'pursuit', 'file': '105 second loopable -- Sisyphus.aif'},
-            {'key': 'multiball', 'file': 'Heroes and Angels -- Loopable.aif'},
-        ]
-
-        effects_files = [
-            {'key': 'block_war_target', 'file': 'DropTarget.ogg'},
-            {'key': 'outlane', 'file': 'Outlane.wav'},
-            {'key': 'inlane', 'file': 'Inlane.wav'},
-            {'key': 'meltdown', 'file': 'CaptiveBall.ogg'},
-            {'key': 'ball_launch', 'file': 'BallLaunchMotorcycle.wav'},
-            {'key': 'drop_target', 'file': 'DropTarget.ogg'},
-            {'key': 'extra_ball_target', 'file': 'ExtraBallTargetLower.wav'},
-            {'key': 'shooterL_launch', 'file': 'LeftKickBack.ogg'},
-            {'key': 'outer_loop', 'file': 'BallLaunchMotorcycle.wav'},
-            {'key': 'inner_loop', 'file': 'BallLaunchMotorcycle.wav'},
-            {'key': 'mystery', 'file': 'Question Mark.wav'},
-            {'key': 'right_ramp', 'file': 'RightRampFlyBy.ogg'},
-            {'key': 'left_ramp', 'file': 'LoopFlyBy.wav'},
-            {'key': 'slingshot', 'file': 'Slingshot.wav'},
-            {'key': 'bonus', 'file': 'DropTarget.ogg'}
-        ]
-
-        voice_files = [
-            {'key': 'attract', 'file': 'attract/jd - dont do drugs.wav'},
-            {'key': 'attract', 'file': 'attract/jd - gaze into the fist of dredd.wav'},
-            {'key': 'attract', 'file': 'attract/jd - i am the law.wav'},
-            {'key': 'attract', 'file': 'judge death/judge death - i have come to bring law to the city my law.wav'},
-            {'key': 'attract', 'file': 'judge death/judge death - i have come to bring you the law of death.wav'},
-            {'key': 'attract', 'file': 'judge death/judge death - i have come to stop this world again.wav'},
-            {'key': 'attract', 'file': 'judge death/judge death - my name is death i have come to judge you.wav'},
-            {'key': 'attract', 'file': 'judge death/judge death - the crime is life.wav'},
-            {'key': 'attract', 'file': 'judge death/judge death - the sentence is death.wav'},
-            {'key': 'attract', 'file': 'judge fire/judge fire - for you the party is over.wav'},
-            {'key': 'attract', 'file': 'judge fire/judge fire - let the flames of justice cleanse you.wav'},
-            {'key': 'drain', 'file': 'drain/jd - prepare to be judged.wav'},
-            {'key': 'boring', 'file': 'boring/jd - its way too quiet.wav'},
-            {'key': 'boring', 'file': 'boring/jd - this is boring.wav'},
-            {'key': 'boring', 'file': 'boring/wake me when something happens.wav'},
-            {'key': 'good shot', 'file': 'good shot/great shot.wav'},
-            {'key': 'good shot', 'file': 'good shot/incredible shot.wav'},
-            {'key': 'good shot', 'file': 'good shot/jd - do it again.wav'},
-            {'key': 'good shot', 'file': 'good shot/jd - excellent.wav'},
-            {'key': 'good shot', 'file': 'good shot/wow thats awesome.wav'},
-            {'key': 'pursuit intro', 'file': 'pursuit/bank robbery suspects fleeing.wav'},
-            {'key': 'pursuit', 'file': 'pursuit/jd - in pursuit 1.wav'},
-            {'key': 'pursuit', 'file': 'pursuit/jd - in pursuit 2.wav'},
-            {'key': 'pursuit complete', 'file': 'pursuit/jd - suspects apprehended.wav'},
-            {'key': 'pursuit failed', 'file': 'pursuit/jd - suspects got away.wav'},
-            {'key': 'sniper - miss', 'file': 'sniper/jd - missed him.wav'},
-            {'key': 'sniper - miss', 'file': 'sniper/jd - drokk.wav'},
-            {'key': 'sniper - miss', 'file': 'sniper/jd - grud.wav'},
-            {'key': 'sniper - hit', 'file': 'sniper/jd - sniper neutralized.wav'},
-            {'key': 'sniper - hit', 'file': 'sniper/jd - take that punk.wav'},
-            {'key': 'sniper - shot', 'file': 'sniper/gunshot.wav'},
-            {'key': 'tank intro', 'file': 'battle tank/unknown tank block 1.wav'},
-            {'key': 'tank intro', 'file': 'battle tank/unknown tank block 2.wav'},
-            {'key': 'tank intro', 'file': 'battle tank/unknown tank block 3.wav'},
-            {'key': 'tank intro', 'file': 'battle tank/unknown tank block 4.wav'},
-            {'key': 'tank intro', 'file': 'battle tank/unknown tank block 5.wav'},
-            {'key': 'tank intro', 'file': 'battle tank/unknown tank block 6.wav'},
-            {'key': 'tank intro', 'file': 'battle tank/unknown tank block 7.wav'},
-            {'key': 'tank intro', 'file': 'battle tank/unknown tank block 8.wav'},
-            {'key': 'tank intro', 'file': 'battle tank/unknown tank block 9.wav'},
-            {'key': 'tank intro', 'file': 'battle tank/unknown tank block 10.wav'},
-            {'key': 'tank hit 1', 'file': 'battle tank/its damaged but still going.wav'},
-            {'key': 'tank hit 2', 'file': 'battle tank/tank hit 1 more shot.wav'},
-            {'key': 'tank hit 3', 'file': 'battle tank/tank down.wav'},
-            {'key': 'meltdown 1', 'file': 'meltdown/reactor 1 stabilized.wav'},
-            {'key': 'meltdown 2', 'file': 'meltdown/reactor 2 stabilized.wav'},
-            {'key': 'meltdown 3', 'file': 'meltdown/reactor 3 stabilized.wav'},
-            {'key': 'meltdown 4', 'file': 'meltdown/reactor 4 stabilized.wav'},
-            {'key': 'meltdown all', 'file': 'meltdown/all reactors stabilized.wav'},
-            {'key': 'meltdown intro', 'file': 'meltdown/power towers going critical.wav'},
-            {'key': 'bad impersonator ouch', 'file': 'bad impersonator/ouch 1.wav'},
-            {'key': 'bad impersonator ouch', 'file': 'bad impersonator/ouch 2.wav'},
-            {'key': 'bad impersonator ouch', 'file': 'bad impersonator/ouch 3.wav'},
-            {'key': 'bad impersonator ouch', 'file': 'bad impersonator/ouch 4.wav'},
-            {'key': 'bad impersonator ouch', 'file': 'bad impersonator/ouch 5.wav'},
-            {'key': 'bad impersonator song', 'file': 'bad impersonator/song 1.wav'},
-            {'key': 'bad impersonator song', 'file': 'bad impersonator/song 2.wav'},
-            {'key': 'bad impersonator song', 'file': 'bad impersonator/song 3.wav'},
-            {'key': 'bad impersonator song', 'file': 'bad impersonator/song 4.wav'},
-            {'key': 'bad impersonator song', 'file': 'bad impersonator/song 5.wav'},
-            {'key': 'bad impersonator boo', 'file': 'bad impersonator/boo 1.wav'},
-            {'key': 'bad impersonator boo', 'file': 'bad impersonator/boo 2.wav'},
-            {'key': 'bad impersonator boo', 'file': 'bad impersonator/boo 3.wav'},
-            {'key': 'bad impersonator boo', 'file': 'bad impersonator/boo 4.wav'},
-            {'key': 'bad impersonator boo', 'file': 'bad impersonator/boo 5.wav'},
-            {'key': 'bad impersonator shutup', 'file': 'bad impersonator/Shut Up 1.wav'},
-            {'key': 'bad impersonator shutup', 'file': 'bad impersonator/Shut Up 2.wav'},
-            {'key': 'bad impersonator shutup', 'file': 'bad impersonator/Shut Up 3.wav'},
-            {'key': 'bad impersonator shutup', 'file': 'bad impersonator/Shut Up 4.wav'},
-            {'key': 'bad impersonator', 'file': 'bad impersonator/bad impersonation in progress.wav'},
-            {'key': 'safecracker bad guys', 'file': 'safecracker/hurry up.wav'},
-            {'key': 'safecracker bad guys', 'file': 'safecracker/running out of time.wav'},
-            {'key': 'safecracker complete', 'file': 'safecracker/jd - youre done.wav'},
-            {'key': 'safecracker shot', 'file': 'safecracker/surrounded.wav'},
-            {'key': 'safecracker shot', 'file': 'good shot/great shot.wav'},
-            {'key': 'safecracker shot', 'file': 'good shot/jd - excellent.wav'},
-            {'key': 'safecracker shot', 'file': 'good shot/jd - do it again.wav'},
-            {'key': 'manhunt - intro', 'file': 'manhunt/bank robbers trying to escape judgement.wav'},
-            {'key': 'manhunt - shot', 'file': 'manhunt/aahh.wav'},
-            {'key': 'manhunt - shot', 'file': 'manhunt/jd - i got one.wav'},
-            {'key': 'manhunt - shot', 'file': 'manhunt/jd - that will stop him.wav'},
-            {'key': 'manhunt - done', 'file': 'manhunt/jd - fugitives captured.wav'},
-            {'key': 'stakeout over there', 'file': 'stakeout/jd - over there 1.wav'},
-            {'key': 'stakeout over there', 'file': 'stakeout/jd - over there 2.wav'},
-            {'key': 'stakeout surrounded', 'file': 'stakeout/jd - we have you surrounded.wav'},
-            {'key': 'stakeout move in', 'file': 'stakeout/jd - move in now.wav'},
-            {'key': 'stakeout move in', 'file': 'stakeout/jd - thats it take em down.wav'},
-            {'key': 'stakeout boring', 'file': 'stakeout/jd - are we sure we have the right place.wav'},
-            {'key': 'stakeout boring', 'file': 'stakeout/most boring stakeout ever.wav'},
-            {'key': 'stakeout boring', 'file': 'boring/jd - its way too quiet.wav'},
-            {'key': 'stakeout boring', 'file': 'boring/jd - this is boring.wav'},
-            {'key': 'stakeout boring', 'file': 'boring/wake me when something happens.wav'},
-            {'key': 'Block 1 Neutralized', 'file': 'blocks/block 1 neutralized.wav'},
-            {'key': 'Block 1 Pacified', 'file': 'blocks/block 1 pacified.wav'},
-            {'key': 'Block 1 Secured', 'file': 'blocks/block 1 secured.wav'},
-            {'key': 'Block 2 Neutralized', 'file': 'blocks/block 2 neutralized.wav'},
-            {'key': 'Block 2 Pacified', 'file': 'blocks/block 2 pacified.wav'},
-            {'key': 'Block 2 Secured', 'file': 'blocks/block 2 secured.wav'},
-            {'key': 'Block 3 Neutralized', 'file': 'blocks/block 3 neutralized.wav'},
-            {'key': 'Block 3 Pacified', 'file': 'blocks/block 3 pacified.wav'},
-            {'key': 'Block 3 Secured', 'file': 'blocks/block 3 secured.wav'},
-            {'key': 'Block 4 Neutralized', 'file': 'blocks/block 4 neutralized.wav'},
-            {'key': 'Block 4 Pacified', 'file': 'blocks/block 4 pacified.wav'},
-            {'key': 'Block 4 Secured', 'file': 'blocks/block 4 secured.wav'},
-            {'key': 'Block 5 Neutralized', 'file': 'blocks/block 5 neutralized.wav'},
-            {'key': 'Block 5 Pacified', 'file': 'blocks/block 5 pacified.wav'},
-            {'key': 'Block 5 Secured', 'file': 'blocks/block 5 secured.wav'},
-            {'key': 'Block 6 Neutralized', 'file': 'blocks/block 6 neutralized.wav'},
-            {'key': 'Block 6 Pacified', 'file': 'blocks/block 6 pacified.wav'},
-            {'key': 'Block 6 Secured', 'file': 'blocks/block 6 secured.wav'},
-            {'key': 'Block 7 Neutralized', 'file': 'blocks/block 7 neutralized.wav'},
-            {'key': 'Block 7 Pacified', 'file': 'blocks/block 7 pacified.wav'},
-            {'key': 'Block 7 Secured', 'file': 'blocks/block 7 secured.wav'},
-            {'key': 'Block 8 Neutralized', 'file': 'blocks/block 8 neutralized.wav'},
-            {'key': 'Block 8 Pacified', 'file': 'blocks/block 8 pacified.wav'},
-            {'key': 'Block 8 Secured', 'file': 'blocks/block 8 secured.wav'},
-            {'key': 'Block 9 Neutralized', 'file': 'blocks/block 9 neutralized.wav'},
-            {'key': 'Block 9 Pacified', 'file': 'blocks/block 9 pacified.wav'},
-            {'key': 'Block 9 Secured', 'file': 'blocks/block 9 secured.wav'},
-            {'key': 'Block 10 Neutralized', 'file': 'blocks/block 10 neutralized.wav'},
-            {'key': 'Block 10 Pacified', 'file': 'blocks/block 10 pacified.wav'},
-            {'key': 'Block 10 Secured', 'file': 'blocks/block 10 secured.wav'},
-            {'key': 'Block 11 Neutralized', 'file': 'blocks/block 11 neutralized.wav'},
-            {'key': 'Block 11 Pacified', 'file': 'blocks/block 11 pacified.wav'},
-            {'key': 'Block 11 Secured', 'file': 'blocks/block 11 secured.wav'},
-            {'key': 'Block 12 Neutralized', 'file': 'blocks/block 12 neutralized.wav'},
-            {'key': 'Block 12 Pacified', 'file': 'blocks/block 12 pacified.wav'},
-            {'key': 'Block 12 Secured', 'file': 'blocks/block 12 secured.wav'},
-            {'key': 'Block 13 Neutralized', 'file': 'blocks/block 13 neutralized.wav'},
-            {'key': 'Block 13 Pacified', 'file': 'blocks/block 13 pacified.wav'},
-            {'key': 'Block 13 Secured', 'file': 'blocks/block 13 secured.wav'},
-            {'key': 'Block 14 Neutralized', 'file': 'blocks/block 14 neutralized.wav'},
-            {'key': 'Block 14 Pacified', 'file': 'blocks/block 14 pacified.wav'},
-            {'key': 'Block 14 Secured', 'file': 'blocks/block 14 secured.wav'},
-            {'key': 'Block 15 Neutralized', 'file': 'blocks/block 15 neutralized.wav'},
-            {'key': 'Block 15 Pacified', 'file': 'blocks/block 15 pacified.wav'},
-            {'key': 'Block 15 Secured', 'file': 'blocks/block 15 secured.wav'},
-            {'key': 'Block 16 Neutralized', 'file': 'blocks/block 16 neutralized.wav'},
-            {'key': 'Block 16 Pacified', 'file': 'blocks/block 16 pacified.wav'},
-            {'key': 'Block 16 Secured', 'file': 'blocks/block 16 secured.wav'},
-            {'key': 'crime', 'file': 'crimes/crime 1.wav'},
-            {'key': 'crime', 'file': 'crimes/crime 2.wav'},
-            {'key': 'crime', 'file': 'crimes/crime 3.wav'},
-            {'key': 'crime', 'file': 'crimes/crime 4.wav'},
-            {'key': 'crime', 'file': 'crimes/crime 5.wav'},
-            {'key': 'crime', 'file': 'crimes/crime 6.wav'},
-            {'key': 'crime', 'file': 'crimes/crime 7.wav'},
-            {'key': 'crime', 'file': 'crimes/crime 8.wav'},
-            {'key': 'crime', 'file': 'crimes/crime 9.wav'},
-            {'key': 'crime', 'file': 'crimes/crime 10.wav'},
-            {'key': 'crime', 'file': 'crimes/crime 11.wav'},
-            {'key': 'crime', 'file': 'crimes/crime 12.wav'},
-            {'key': 'crime', 'file': 'crimes/crime 13.wav'},
-            {'key': 'crime', 'file': 'crimes/crime 14.wav'},
-            {'key': 'crime', 'file': 'crimes/crime 15.wav'},
-            {'key': 'crime', 'file': 'crimes/crime 16.wav'},
-            {'key': 'block war', 'file': 'block war/riot in sector 13.wav'},
-            {'key': 'block war', 'file': 'block war/rioting reported.wav'},
-            {'key': 'block war', 'file': 'block war/war 1.wav'},
-            {'key': 'block war', 'file': 'block war/war 2.wav'},
-            {'key': 'block war', 'file': 'block war/war 3.wav'},
-            {'key': 'block war', 'file': 'block war/war 4.wav'},
-            {'key': 'jackpot is lit', 'file': 'jackpot/jackpot is lit.wav'},
-            {'key': 'jackpot', 'file': 'jackpot/jaackpott.wav'},
-            {'key': 'jackpot', 'file': 'jackpot/jackpot - excited.wav'},
-            {'key': 'shoot the left ramp', 'file': 'multiball/shoot the left ramp.wav'},
-            {'key': 'shoot the left ramp', 'file': 'multiball/jd - shoot the left ramp.wav'},
-            {'key': 'again', 'file': 'multiball/again.wav'},
-            {'key': 'locks lit', 'file': 'multiball/jd - lets lock em up.wav'},
-            {'key': 'ball 1 locked', 'file': 'multiball/jd - ball 1 captured.wav'},
-            {'key': 'ball 2 locked', 'file': 'multiball/jd - ball 2 locked.wav'},
-            {'key': 'multiball', 'file': 'multiball/calling all units the gang has escaped.wav'},
-            {'key': 'multiball', 'file': 'multiball/escape from detention block aa23.wav'},
-            {'key': 'bad guy shot', 'file': 'shooting gallery/man shot 1.wav'},
-            {'key': 'bad guy shot', 'file': 'shooting gallery/man shot 2.wav'},
-            {'key': 'bad guy shot', 'file': 'shooting gallery/man shot 3.wav'},
-            {'key': 'bad guy shot', 'file': 'shooting gallery/man shot 4.wav'},
-            {'key': 'bad guy shot', 'file': 'shooting gallery/man shot 5.wav'},
-            {'key': 'good guy shot', 'file': 'shooting gallery/mother 1.wav'},
-            {'key': 'good guy shot', 'file': 'shooting gallery/mother 2.wav'},
-            {'key': 'moo', 'file': 'shooting gallery/jd - moo.wav'},
-            {'key': 'perfect', 'file': 'shooting gallery/perfect.wav'},
-            {'key': 'tilt warning', 'file': 'tilt/warning.wav'},
-            {'key': 'tilt warning', 'file': 'tilt/jd - im warning you.wav'},
-            {'key': 'tilt', 'file': 'tilt/jd - put down your weapons.wav'},
-            {'key': 'fire - taunt', 'file': 'judge fire/judge fire - for you the party is over.wav'},
-            {'key': 'fire - taunt', 'file': 'judge fire/judge fire - let the flames of justice cleanse you.wav'},
-            {'key': 'fear - taunt', 'file': 'judge fear/judge fear - all must die.wav'},
-            {'key': 'fear - taunt', 'file': 'judge fear/judge fear - gaze into the face of fear.wav'},
-            {'key': 'fear - taunt', 'file': 'judge fear/judge fear - justice must be done.wav'},
-            {'key': 'fear - taunt', 'file': 'judge fear/judge fear - there is no escape from justice.wav'},
-            {'key': 'mortis - taunt', 'file': 'judge mortis/judge mortis - decay in peace.wav'},
-            {'key': 'mortis - taunt', 'file': 'judge mortis/judge mortis - rejoice.wav'},
-            {'key': 'mortis - taunt', 'file': 'judge mortis/judge mortis - this city is guilty.wav'},
-            {'key': 'mortis - taunt', 'file': 'judge mortis/judge mortis - you cannot hurt us now.wav'},
-            {'key': 'death - taunt', 'file': 'judge death/judge death - i have come to bring law to the city my law.wav'},
-            {'key': 'death - taunt', 'file': 'judge death/judge death - i have come to bring you the law of death.wav'},
-            {'key': 'death - taunt', 'file': 'judge death/judge death - i have come to stop this world again.wav'},
-            {'key': 'death - taunt', 'file': 'judge death/judge death - my name is death i have come to judge you.wav'},
-            {'key': 'death - taunt', 'file': 'judge death/judge death - the crime is life.wav'},
-            {'key': 'death - taunt', 'file': 'judge death/judge death - the sentence is death.wav'},
-            {'key': 'death - taunt', 'file': 'judge death/judge death - you cannot kill what does not live.wav'},
-            {'key': 'ball saved', 'file': 'ball saved/pity ball.wav'},
-            {'key': 'ball saved', 'file': 'ball saved/cant you do better than that.wav'},
-            {'key': 'ball saved', 'file': 'ball saved/who told you to stop.wav'},
-            {'key': 'ball saved', 'file': 'ball saved/you may judge again.wav'},
-            {'key': 'ball saved', 'file': 'ball saved/you may judge again 2.wav'},
-            {'key': 'ball saved', 'file': 'ball saved/jd - never do that again.wav'},
-            {'key': 'ball saved', 'file': 'ball saved/jd - i can do better than this.wav'},
-            {'key': 'curse', 'file': 'curse/jd - curse 1.wav'},
-            {'key': 'curse', 'file': 'curse/jd - curse 2.wav'},
-            {'key': 'curse', 'file': 'curse/jd - curse 3.wav'},
-            {'key': 'curse', 'file': 'curse/jd - curse 4.wav'},
-            {'key': 'curse', 'file': 'curse/jd - curse 5.wav'},
-            {'key': 'curse', 'file': 'curse/jd - curse 6.wav'},
-            {'key': 'curse', 'file': 'curse/jd - curse 7.wav'},
-            {'key': 'curse', 'file': 'curse/jd - curse 8.wav'},
-            {'key': 'curse', 'file': 'curse/jd - curse 9.wav'},
-            {'key': 'curse', 'file': 'curse/jd - curse 10.wav'},
-            {'key': 'curse', 'file': 'curse/jd - curse 11.wav'},
-            {'key': 'welcome', 'file': 'welcome/welcome.wav'},
-            {'key': 'welcome', 'file': 'welcome/jd - reporting for duty.wav'},
-            {'key': 'welcome', 'file': 'judge death/judge death - i have come to bring law to the city my law.wav'},
-            {'key': 'welcome', 'file': 'judge death/judge death - i have come to stop this world again.wav'},
-            {'key': 'shoot again 1', 'file': 'shoot again/shoot again player 1.wav'},
-            {'key': 'shoot again 2', 'file': 'shoot again/shoot again player 2.wav'},
-            {'key': 'shoot again 3', 'file': 'shoot again/shoot again player 3.wav'},
-            {'key': 'shoot again 4', 'file': 'shoot again/shoot again player 4.wav'},
-            {'key': 'high score', 'file': 'high score/congratulations.wav'}
-        ]
-
-        fonts_files = [
-            {'key': 'tiny', 'file': '04B-03-7px.dmd'},
-            {'key': 'medium', 'file': 'Font07x5.dmd'},
-            {'key': 'large_num', 'file': 'Font14x10.dmd'},
-            {'key': 'large', 'file': 'Jazz18-18px.dmd'},
-        ]
-
-        assets_path = curr_file_path + '/assets'
-
-        animations_prefix = assets_path + '/dmd/'
-        for asset in animations_files:
-            anim = Animation().load(animations_prefix + asset['file'])
-            repeat = asset.get('repeat', False)
-            hold_last_frame = asset.get('holdLastFrame', False)
-            frame_time = asset.get('frame_time', 1)
-            layer = AnimatedLayer(frames=anim.frames, repeat=repeat, hold=hold_last_frame, frame_time=frame_time)
-            composite_op = asset.get('composite_op')
-            if composite_op:
-                layer.composite_op = composite_op
-            self.animations[asset['key']] = layer
-
-        lampshow_prefix = assets_path + '/lamps/'
-        for asset in lampshow_files:
-            self.game.lampctrl.register_show(asset['key'], lampshow_prefix + asset['file'])
-
-        music_prefix = assets_path + '/sound/music/'
-        for asset in music_files:
-            self.game.sound.register_music(asset['key'], music_prefix + asset['file'])
-
-        effects_prefix = assets_path + '/sound/sfx/'
-        for asset in effects_files:
-            self.game.sound.register_sound(asset['key'], effects_prefix + asset['file'])
-
-        voice_prefix = assets_path + '/sound/voice/'
-        for asset in voice_files:
-            self.game.sound.register_sound(asset['key'], voice_prefix + asset['file'])
-
-        for asset in fonts_files:
-            self.fonts[asset['key']] = font_named(asset['file'])
+    def decode_sound(self, path):
+        # same checks as SoundController.register_sound, which will log the error if we return None
+        if pygame.mixer and pygame.mixer.get_init() and os.path.isfile(path):
+            return pygame.mixer.Sound(str(path))
+        return None
@@ -0,0 +1,109 @@
+"""Check the assets listed in config/assets.yaml and report what each one costs to load.
+
+Every referenced file must exist. The animations, fonts and sounds are decoded one at a time to measure
+their decode time, their decoded memory footprint and their frame count. Music is streamed and lampshows
+need a running game to be parsed, only their file size is reported.
+
+Usage: python asset_preflight.py [--sort time|memory|name] [--output report.txt]
+The exit status is 1 when a file is missing or cannot be decoded.
+"""
+
+import argparse
+import os
+import sys
+import time
+import pygame
+from procgame.dmd import Animation, Font
+from asset_loader import load_manifest
+from fonts import AtlasFont
+from sounds import sound_size
+
+curr_file_path = os.path.dirname(os.path.abspath(__file__))
+
+def decode_animation(path):
+    anim = Animation().load(path)
+    return len(anim.frames), sum(frame.width * frame.height for frame in anim.frames)
+
+def decode_font(path):
+    font = AtlasFont(Font(path))
+    return 1, font.bitmap.width * font.bitmap.height
+
+def decode_sound(path):
+    sound = pygame.mixer.Sound(str(path))
+    return None, sound_size(sound)
+
+decoders = {
+    'animations': decode_animation,
+    'fonts': decode_font,
+    'effects': decode_sound,
+    'voice': decode_sound,
+}
+
+def check_asset(asset_type, asset, path):
+    """return a report row for one asset"""
+    row = {'type': asset_type, 'key': asset['key'], 'file': asset['file'], 'tier': asset.get('tier', 'deferred'),
+           'frames': None, 'memory': 0, 'time': 0.0, 'error': None}
+    if not os.path.isfile(path):
+        row['error'] = 'missing'
+        return row
+
+    decode = decoders.get(asset_type)
+    if decode is None:
+        row['memory'] = os.path.getsize(path)
+        return row
+    start_time = time.time()
+    try:
+        row['frames'], row['memory'] = decode(path)
+    except Exception as e:
+        row['error'] = 'cannot decode: %s' % e
+    row['time'] = time.time() - start_time
+    return row
+
+def write_report(rows, out):
+    out.write('%-10s %-9s %-28s %-40s %7s %10s %9s\n' % ('type', 'tier', 'key', 'file', 'frames', 'bytes', 'ms'))
+    for row in rows:
+        frames = '' if row['frames'] is None else str(row['frames'])
+        out.write('%-10s %-9s %-28s %-40s %7s %10d %9.1f' % (row['type'], row['tier'], row['key'], row['file'], frames, row['memory'], row['time'] * 1000))
+        if row['error']:
+            out.write('  ' + row['error'])
+        out.write('\n')
+
+    out.write('\n%-10s %9s %10s %9s\n' % ('tier', 'assets', 'bytes', 'ms'))
+    for tier in ['boot', 'game', 'deferred']:
+        tier_rows = [row for row in rows if row['tier'] == tier]
+        out.write('%-10s %9d %10d %9.1f\n' % (tier, len(tier_rows), sum(row['memory'] for row in tier_rows), sum(row['time'] for row in tier_rows) * 1000))
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the assets of config/assets.yaml and report their cost')
+    parser.add_argument('--sort', choices=['time', 'memory', 'name'], default='time', help='order of the report, most expensive first')
+    parser.add_argument('--output', help='write the report to this file instead of the standard output')
+    args = parser.parse_args()
+
+    # sounds are decoded without playing them, no audio device is needed
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    pygame.mixer.init()
+
+    manifest, prefixes = load_manifest(curr_file_path)
+    rows = []
+    for asset_type in ['animations', 'fonts', 'lampshows', 'music', 'effects', 'voice']:
+        for asset in manifest.get(asset_type) or []:
+            rows.append(check_asset(asset_type, asset, prefixes[asset_type] + asset['file']))
+
+    if args.sort == 'name':
+        rows.sort(key=lambda row: (row['type'], row['key']))
+    else:
+        rows.sort(key=lambda row: row[args.sort], reverse=True)
+
+    if args.output:
+        with open(args.output, 'w') as out:
+            write_report(rows, out)
+    else:
+        write_report(rows, sys.stdout)
+
+    errors = [row for row in rows if row['error']]
+    for row in errors:
+        sys.stderr.write('%s %s (%s): %s\n' % (row['type'], row['key'], row['file'], row['error']))
+    return 1 if errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
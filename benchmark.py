@@ -0,0 +1,255 @@
+"""Microbenchmarks of the display and mode code, run them without a P-ROC.
+The display benchmarks don't need a game, the mode benchmarks build one on the FakePinPROC without a window or sound.
+
+Usage: python benchmark.py [--repeat N] [name ...]
+Without a name, all the benchmarks are run.
+"""
+
+import argparse
+import os
+import timeit
+from collections import OrderedDict
+import pinproc
+from procgame import dmd
+from procgame.dmd import Animation, AnimatedLayer, Font, Frame
+import compositor as compositors
+from compositor import Compositor, DirtyRectCompositor, NumpyCompositor
+from fonts import AtlasFont
+import layers
+from mode_queue import JDModeQueue
+
+curr_file_path = os.path.dirname(os.path.abspath(__file__))
+fonts_path = curr_file_path + '/assets/fonts/'
+animations_path = curr_file_path + '/assets/dmd/'
+font_files = [('tiny', '04B-03-7px.dmd'), ('medium', 'Font07x5.dmd'), ('large_num', 'Font14x10.dmd'), ('large', 'Jazz18-18px.dmd')]
+sample_texts = ['1,234,567,890', 'PLAYER 2', 'Shoot the left ramp', 'Ball 3 - Free Play']
+
+benchmarks = OrderedDict()
+
+def benchmark(func):
+    benchmarks[func.__name__] = func
+    return func
+
+def report(name, before, after):
+    print('%-40s %10.2f us %10.2f us %6.2fx' % (name, before * 1e6, after * 1e6, before / after if after else 0))
+
+def time_per_call(func, repeat):
+    return min(timeit.repeat(func, number=repeat, repeat=3)) / repeat
+
+@benchmark
+def fonts(repeat):
+    """Font against AtlasFont, measuring and drawing text"""
+    for key, filename in font_files:
+        font = Font(fonts_path + filename)
+        atlas_font = AtlasFont(font)
+        frame = Frame(128, 32)
+        for text in sample_texts:
+            assert font.size(text) == atlas_font.size(text)
+            report('%s size %r' % (key, text), time_per_call(lambda: font.size(text), repeat), time_per_call(lambda: atlas_font.size(text), repeat))
+            report('%s draw %r' % (key, text), time_per_call(lambda: font.draw(frame, text, 0, 0), repeat), time_per_call(lambda: atlas_font.draw(frame, text, 0, 0), repeat))
+
+def timed_mode_display(text_layer_class, grouped_layer_class):
+    """return the layers of a timed mode display like TimedMode.mode_layer, and a function changing its score"""
+    font_small = AtlasFont(Font(fonts_path + '04B-03-7px.dmd'))
+    font_num = AtlasFont(Font(fonts_path + 'Font14x10.dmd'))
+    countdown_layer = text_layer_class(127, 1, font_small, 'right').set_text('25')
+    name_layer = text_layer_class(1, 1, font_small, 'left').set_text('Pursuit')
+    score_layer = text_layer_class(128/2, 10, font_num, 'center').set_text('1,000,000')
+    status_layer = text_layer_class(128/2, 26, font_small, 'center').set_text('Shots made: 1/3')
+    mode_layer = grouped_layer_class(128, 32, [countdown_layer, name_layer, score_layer, status_layer])
+    score = [1000000]
+    def add_points():
+        score[0] += 10000
+        score_layer.set_text('{:,}'.format(score[0]))
+    return [mode_layer], add_points
+
+@benchmark
+def compositor(repeat):
+    """full against dirty rectangle composition of a timed mode display, the score changes every 10 frames"""
+    def run(compositor, display):
+        display_layers, add_points = display
+        count = [0]
+        def compose():
+            count[0] += 1
+            if count[0] % 10 == 0:
+                add_points()
+            compositor.compose(display_layers)
+        return compose
+    before = time_per_call(run(Compositor(None), timed_mode_display(dmd.TextLayer, dmd.GroupedLayer)), repeat)
+    after = time_per_call(run(DirtyRectCompositor(None), timed_mode_display(layers.TextLayer, layers.GroupedLayer)), repeat)
+    report('compose timed mode display', before, after)
+
+@benchmark
+def message_layer(repeat):
+    """slide a status message in and out like JD2Game.set_status, count the frames allocated"""
+    font = AtlasFont(Font(fonts_path + '04B-03-7px.dmd'))
+    layer = layers.FixedSizeTextLayer(128/2, 32-6, font, 'center', opaque=False, width=128, height=6)
+    transition = layers.SlideTransition(direction='west')
+    layer.transition = transition
+    def slide():
+        layer.set_text('Ball saved')
+        transition.start()
+        for unused in range(20):
+            layer.composite_next(Frame(128, 32))
+    slide()
+    allocations = layers.FrameBuffers.allocations
+    misses = layers.text_frame_cache.misses
+    print('%-40s %10.2f us' % ('slide message in', time_per_call(slide, repeat) * 1e6))
+    print('frames allocated after the first slide: %d by transitions, %d by text layers' %
+          (layers.FrameBuffers.allocations - allocations, layers.text_frame_cache.misses - misses))
+
+def status_transition():
+    """return the transition of the status line, like JD2Game.create_message_layer"""
+    slide_in_transition = layers.SlideTransition(direction='west')
+    dont_move_transition = layers.DontMoveTransition()
+    dont_move_transition.progress_per_frame = 1.0 / 120.0
+    slide_out_transition = layers.SlideTransition(direction='west')
+    slide_out_transition.in_out = 'out'
+    return layers.GroupedTransition([slide_in_transition, dont_move_transition, slide_out_transition])
+
+@benchmark
+def status_message(repeat):
+    """a whole status line message with its transition computed on every frame, against played back from the cache"""
+    font = AtlasFont(Font(fonts_path + '04B-03-7px.dmd'))
+    live_layer = layers.FixedSizeTextLayer(128/2, 32-6, font, 'center', opaque=False, width=128, height=6)
+    live_layer.transition = status_transition()
+    def live():
+        done = []
+        live_layer.transition.completed_handler = lambda: done.append(True)
+        live_layer.set_text('EXTRA BALL LIT')
+        live_layer.transition.start()
+        while not done:
+            live_layer.composite_next(Frame(128, 32))
+
+    cached_layer = layers.MessageLayer(128/2, 32-6, font, status_transition(), 'center', opaque=False, width=128, height=6)
+    def cached():
+        done = []
+        cached_layer.completed_handler = lambda: done.append(True)
+        cached_layer.play('EXTRA BALL LIT')
+        while not done:
+            cached_layer.composite_next(Frame(128, 32))
+
+    report('status message', time_per_call(live, max(1, repeat / 100)), time_per_call(cached, max(1, repeat / 100)))
+
+def attract_display():
+    """return the layers of an attract page: an animation with text over it"""
+    font_large = AtlasFont(Font(fonts_path + 'Jazz18-18px.dmd'))
+    font_small = AtlasFont(Font(fonts_path + '04B-03-7px.dmd'))
+    anim_layer = AnimatedLayer(frames=Animation().load(animations_path + 'Splash.dmd').frames, repeat=True, frame_time=1)
+    title_layer = layers.TextLayer(128/2, 7, font_large, 'center').set_text('Judge Dredd')
+    title_layer.composite_op = 'blacksrc'
+    press_start_layer = layers.TextLayer(128/2, 26, font_small, 'center').set_text('Press Start')
+    press_start_layer.composite_op = 'blacksrc'
+    return [layers.GroupedLayer(128, 32, [anim_layer, title_layer, press_start_layer])]
+
+def multiball_display():
+    """return the layers of a busy multiball screen: 4 player scores, a timed mode and an animation on top"""
+    font_small = AtlasFont(Font(fonts_path + '04B-03-7px.dmd'))
+    font_medium = AtlasFont(Font(fonts_path + 'Font09x7.dmd'))
+    scores = [layers.TextLayer(x, y, font_medium, justify).set_text(text) for x, y, justify, text in
+              [(0, 0, 'left', '1,250,340'), (128, 0, 'right', '3,410,870'), (0, 11, 'left', '980,110'), (128, 11, 'right', '2,000,090')]]
+    scores.append(layers.TextLayer(128/2, 26, font_small, 'center').set_text('BALL 2      FREE PLAY'))
+    score_layer = layers.GroupedLayer(128, 32, scores)
+    mode_layers, add_points = timed_mode_display(layers.TextLayer, layers.GroupedLayer)
+    mode_layers[0].opaque = False
+    anim_layer = AnimatedLayer(frames=Animation().load(animations_path + 'Splash.dmd').frames, repeat=True, frame_time=1)
+    anim_layer.composite_op = 'blacksrc'
+    return [score_layer] + mode_layers + [anim_layer]
+
+@benchmark
+def numpy_compositor(repeat):
+    """Frame against NumPy composition of the attract display and a busy multiball display"""
+    if compositors.numpy is None:
+        print('numpy is not installed')
+        return
+    for name, display in [('attract', attract_display), ('multiball', multiball_display)]:
+        frame_layers = display()
+        full_compositor = Compositor(None)
+        before = time_per_call(lambda: full_compositor.compose(frame_layers), repeat)
+        numpy_compositor = NumpyCompositor(None)
+        after = time_per_call(lambda: numpy_compositor.compose(frame_layers), repeat)
+        report('compose %s display' % name, before, after)
+
+game = None
+
+def game_in_play():
+    """return a JD2Game with a ball in play, the modes of BasePlay and RegularPlay are running"""
+    global game
+    if game is None:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+        # the game loads its configuration and its assets relative to the current directory
+        os.chdir(curr_file_path)
+        from jd2 import JD2Game
+        game = JD2Game()
+        game.start_game(supergame=False)
+    return game
+
+def scan_send_event(modes, event):
+    """JD2Game.send_event before the handlers were indexed"""
+    for mode in modes[:]:
+        handler = getattr(mode, event, None)
+        if handler:
+            ret = handler()
+            if ret:
+                return ret
+
+@benchmark
+def send_event(repeat):
+    """scan the modes for the handler of an event against the handlers indexed by JDModeQueue"""
+    modes = game_in_play().modes
+    events = ['evt_ball_started', 'evt_ball_drained', 'evt_ball_ended', 'evt_shooterL_active_500ms']
+    # the handlers change the game, time the dispatch to handlers doing nothing
+    stubbed = [(mode, event) for mode in modes.modes for event in events if hasattr(mode, event)]
+    for mode, event in stubbed:
+        setattr(mode, event, lambda: None)
+    modes.invalidate()
+    print('%d modes, %d handlers' % (len(modes.modes), len(stubbed)))
+    try:
+        for event in events:
+            report('send %s' % event, time_per_call(lambda: scan_send_event(modes, event), repeat),
+                   time_per_call(lambda: modes.send_event(event), repeat))
+    finally:
+        for mode, event in stubbed:
+            delattr(mode, event)
+        modes.invalidate()
+
+@benchmark
+def switch_storm(repeat):
+    """switch events during multiball passed to every mode against the modes indexed by switch in JDModeQueue"""
+    game = game_in_play()
+    modes = game.modes
+    # the modes of a multiball with a chain mode running
+    regular_play = game.base_play.regular_play
+    regular_play.multiball.start_multiball()
+    chain_mode = regular_play.chain.all_chain_modes[0]
+    if chain_mode not in modes:
+        modes.add(chain_mode)
+    switches = [game.switches[name] for name in ['slingL', 'slingR', 'flipperLwL', 'flipperLwR', 'leftRampExit', 'rightRampExit']]
+    events = [{'type': event_type, 'value': sw.number} for sw in switches
+              for event_type in [pinproc.EventTypeSwitchClosedDebounced, pinproc.EventTypeSwitchOpenDebounced]]
+    print('%d modes, %d of them handle the storm switches' % (len(modes.modes), len(set(mode for sw in switches for mode, accepted in modes.modes_handling(sw.name)))))
+    def storm(handle_event):
+        def run():
+            for event in events:
+                handle_event(event)
+        return run
+    before = time_per_call(storm(lambda event: super(JDModeQueue, modes).handle_event(event)), repeat) / len(events)
+    after = time_per_call(storm(modes.handle_event), repeat) / len(events)
+    report('switch event', before, after)
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the display and mode microbenchmarks')
+    parser.add_argument('--repeat', type=int, default=1000, help='number of calls timed per measurement')
+    parser.add_argument('names', nargs='*', help='benchmarks to run among ' + ', '.join(benchmarks.keys()) + ', all by default')
+    args = parser.parse_args()
+    for name in args.names:
+        if name not in benchmarks:
+            parser.error('unknown benchmark ' + name)
+
+    print('%-40s %13s %13s %7s' % ('benchmark', 'before', 'after', 'speedup'))
+    for name in args.names or benchmarks.keys():
+        benchmarks[name](args.repeat)
+
+if __name__ == '__main__':
+    main()
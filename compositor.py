@@ -0,0 +1,327 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+from procgame import dmd
+from procgame.config import value_for_key_path
+from procgame.dmd import Frame
+import layers
+from layers import FrameBuffers, composite, has_stable_frames, placement, text_frame_cache, visible_layers
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class Compositor(object):
+    """Builds the DMD frame from the layers of the modes, it replaces DisplayController.update().
+       This one composites every layer on a new frame like DisplayController does, and measures itself.
+    """
+
+    def __init__(self, game, width=128, height=32):
+        self.game = game
+        self.width = width
+        self.height = height
+        self.frames = 0
+        self.compose_time = 0.0
+        self.stats_interval = value_for_key_path('dmd_stats_interval', 0)
+        self.stats_start = None
+        self.logger = logging.getLogger('game.dmd')
+
+    def install(self):
+        # DisplayController.update is called by BasicGame.dmd_event
+        self.game.dmd.update = self.update
+
+    def layers(self):
+        """return the layers to composite in order, the same selection as DisplayController.update"""
+        layers = []
+        for mode in self.game.modes.modes:
+            layer = getattr(mode, 'layer', None)
+            if layer != None:
+                layers.append(layer)
+                if layer.opaque:
+                    # the layers below an opaque layer are hidden
+                    break
+        layers.reverse()
+        if self.game.dmd.message_layer != None:
+            layers.append(self.game.dmd.message_layer)
+        return layers
+
+    def update(self):
+        start_time = time.time()
+        frame = self.compose(self.layers())
+        self.compose_time += time.time() - start_time
+        self.frames += 1
+        if self.stats_interval:
+            self.log_stats()
+
+        for handler in self.game.dmd.frame_handlers:
+            handler(frame)
+        return frame
+
+    def compose(self, layers):
+        frame = Frame(self.width, self.height)
+        for layer in layers:
+            if layer.enabled:
+                layer.composite_next(frame)
+        return frame
+
+    def stats(self):
+        return {'frames': self.frames, 'compose time': self.compose_time, 'transition frames allocated': FrameBuffers.allocations,
+                'text cache hits': text_frame_cache.hits, 'text cache misses': text_frame_cache.misses}
+
+    def log_stats(self):
+        """log the frames per second per percent of CPU used by the process, compare the compositors with it"""
+        now = time.time()
+        cpu = sum(os.times()[:2])
+        if self.stats_start is None:
+            self.stats_start = (now, cpu, self.frames)
+            return
+        start_time, start_cpu, start_frames = self.stats_start
+        elapsed = now - start_time
+        if elapsed < self.stats_interval:
+            return
+        fps = (self.frames - start_frames) / elapsed
+        cpu_percent = 100.0 * (cpu - start_cpu) / elapsed
+        self.logger.info('%s: %.1f fps, %.1f%% cpu, %.2f fps per cpu %%, %s', self.__class__.__name__, fps, cpu_percent,
+                         fps / cpu_percent if cpu_percent else 0.0, ', '.join('%s %s' % item for item in sorted(self.stats().items())))
+        self.stats_start = (now, cpu, self.frames)
+
+
+class DirtyRectCompositor(Compositor):
+    """A compositor that reuses the previous frame and only composites the region that changed.
+       A layer reports a change by returning a different frame, see layers.has_stable_frames.
+       The layers that can't report changes are composited on every frame, and a transition
+       needs the frame composited below it so any layer in transition falls back to a full composition.
+    """
+
+    def __init__(self, game, width=128, height=32):
+        super(DirtyRectCompositor, self).__init__(game, width, height)
+        self.frame = None
+        self.placements = None
+        self.reused = 0
+        self.partial = 0
+        self.full = 0
+        self.dirty_dots = 0
+
+    def compose(self, layers):
+        # every layer must be asked for its next frame exactly once, that's what makes animations advance
+        frames = []
+        for layer in layers:
+            if layer.enabled:
+                frame = layer.next_frame()
+                if frame != None:
+                    frames.append((layer, frame))
+        placements = [placement(layer, frame) for layer, frame in frames]
+
+        if self.placements is None or any(layer.transition != None for layer, frame in frames):
+            return self.compose_full(frames, placements)
+
+        dirty = self.dirty_rect(frames, placements)
+        if dirty is None:
+            self.reused += 1
+            self.placements = placements
+            return self.frame
+        x, y, width, height = dirty
+        if width * height == self.width * self.height:
+            return self.compose_full(frames, placements)
+
+        # the previous frame might still be in use, composite the dirty region on a copy
+        composed = self.frame.copy()
+        composed.fill_rect(x, y, width, height, 0)
+        for (frame, frame_x, frame_y, op) in placements:
+            # copy the part of the frame inside the dirty region
+            left = max(x, frame_x)
+            top = max(y, frame_y)
+            right = min(x + width, frame_x + frame.width)
+            bottom = min(y + height, frame_y + frame.height)
+            if left < right and top < bottom:
+                Frame.copy_rect(dst=composed, dst_x=left, dst_y=top, src=frame, src_x=left - frame_x, src_y=top - frame_y,
+                                width=right - left, height=bottom - top, op=op)
+        self.partial += 1
+        self.dirty_dots += width * height
+        self.frame = composed
+        self.placements = placements
+        return composed
+
+    def compose_full(self, frames, placements):
+        composed = Frame(self.width, self.height)
+        for layer, frame in frames:
+            composite(layer, frame, composed)
+        self.full += 1
+        self.dirty_dots += self.width * self.height
+        self.frame = composed
+        # the output of a transition depends on what is below it, don't reuse it
+        self.placements = None if any(layer.transition != None for layer, frame in frames) else placements
+        return composed
+
+    def dirty_rect(self, frames, placements):
+        """return the bounding box of the dots that might have changed since the previous frame, or None"""
+        rects = []
+        for index in range(max(len(placements), len(self.placements))):
+            new = placements[index] if index < len(placements) else None
+            old = self.placements[index] if index < len(self.placements) else None
+            unchanged = (new != None and old != None and new[0] is old[0] and new[1:] == old[1:] and has_stable_frames(frames[index][0]))
+            if not unchanged:
+                # a dot covered by a layer that moved, changed or was added or removed in the stack
+                for item in (new, old):
+                    if item != None:
+                        frame, x, y, op = item
+                        rects.append((x, y, x + frame.width, y + frame.height))
+        if not rects:
+            return None
+        left = max(0, min(rect[0] for rect in rects))
+        top = max(0, min(rect[1] for rect in rects))
+        right = min(self.width, max(rect[2] for rect in rects))
+        bottom = min(self.height, max(rect[3] for rect in rects))
+        if left >= right or top >= bottom:
+            return None
+        return (left, top, right - left, bottom - top)
+
+    def stats(self):
+        stats = super(DirtyRectCompositor, self).stats()
+        stats.update({'reused': self.reused, 'partial': self.partial, 'full': self.full, 'dirty dots': self.dirty_dots})
+        return stats
+
+
+class NumpyCompositor(Compositor):
+    """A compositor working on uint8 NumPy arrays, each composite op is a vectorized operation on array slices.
+       The grouped layers are flattened so their layers are composited directly on the DMD frame.
+       The frames of layers in transition need a Frame to transition from, that frame is composited by the base class.
+    """
+
+    # GroupedLayer classes whose next_frame() only composites their layers
+    flattened_types = (layers.GroupedLayer, dmd.GroupedLayer)
+
+    def __init__(self, game, width=128, height=32):
+        super(NumpyCompositor, self).__init__(game, width, height)
+        self.arrays = OrderedDict() # id of a stable frame -> (frame, array), least recently used first
+        self.conversions = 0
+        self.fallbacks = 0
+        self.ops = {'clear': self.op_clear, 'copy': self.op_copy, 'blacksrc': self.op_blacksrc, 'add': self.op_add, 'sub': self.op_sub, 'alpha': self.op_alpha}
+
+    def compose(self, layers):
+        if any(self.needs_frame(layer) for layer in layers):
+            self.fallbacks += 1
+            return super(NumpyCompositor, self).compose(layers)
+
+        items = []
+        clip = (0, 0, self.width, self.height)
+        for layer in layers:
+            self.collect(layer, 0, 0, clip, items)
+        dots = numpy.zeros((self.height, self.width), numpy.uint8)
+        for op, src, x, y, clip in items:
+            self.ops[op](dots, src, x, y, clip)
+        frame = Frame(self.width, self.height)
+        frame.set_data(dots.tobytes())
+        return frame
+
+    def is_flattened(self, layer):
+        # a group copied over the layers below is the same as clearing its area and compositing its layers there
+        return (type(layer) in self.flattened_types and layer.transition == None and layer.composite_op == 'copy'
+                and getattr(layer, 'fill_color', None) == None)
+
+    def needs_frame(self, layer):
+        """return True if the layer can only be composited on a Frame, because of a transition or an unknown op"""
+        if not layer.enabled:
+            return False
+        if self.is_flattened(layer):
+            return any(self.needs_frame(child) for child in visible_layers(layer))
+        return layer.transition != None or layer.composite_op not in self.ops
+
+    def collect(self, layer, x, y, clip, items):
+        """append the arrays of the layer and where they go to items"""
+        if not layer.enabled:
+            return
+        x += layer.target_x + layer.target_x_offset
+        y += layer.target_y + layer.target_y_offset
+        if self.is_flattened(layer):
+            # the layers of the group are clipped to the group
+            group_clip = (max(clip[0], x), max(clip[1], y), min(clip[2], x + layer.width), min(clip[3], y + layer.height))
+            group_items = []
+            for child in visible_layers(layer):
+                self.collect(child, x, y, group_clip, group_items)
+            # like GroupedLayer.next_frame(), a group with nothing to composite is transparent
+            if group_items:
+                items.append(('clear', None, 0, 0, group_clip))
+                items.extend(group_items)
+        else:
+            frame = layer.next_frame()
+            if frame != None:
+                items.append((layer.composite_op, self.array(layer, frame), int(x), int(y), clip))
+
+    def array(self, layer, frame):
+        """return the dots of the frame as a height x width array, kept for the frames that don't change"""
+        if not has_stable_frames(layer):
+            self.conversions += 1
+            return numpy.frombuffer(frame.get_data(), numpy.uint8).reshape(frame.height, frame.width)
+        entry = self.arrays.pop(id(frame), None)
+        if entry is None or entry[0] is not frame:
+            self.conversions += 1
+            entry = (frame, numpy.frombuffer(frame.get_data(), numpy.uint8).reshape(frame.height, frame.width))
+            if len(self.arrays) >= 256:
+                self.arrays.popitem(last=False)
+        self.arrays[id(frame)] = entry
+        return entry[1]
+
+    #
+    # Composite ops, vectorized versions of the ops of Frame.copy_rect
+    #
+
+    def slices(self, dots, src, x, y, clip):
+        """return the overlapping slices of dots and src when src is placed at x, y in dots, clipped to clip"""
+        height, width = src.shape
+        left, top = max(x, clip[0]), max(y, clip[1])
+        right, bottom = min(x + width, clip[2]), min(y + height, clip[3])
+        if left >= right or top >= bottom:
+            return None, None
+        return dots[top:bottom, left:right], src[top - y:bottom - y, left - x:right - x]
+
+    def op_clear(self, dots, src, x, y, clip):
+        left, top, right, bottom = clip
+        if left < right and top < bottom:
+            dots[top:bottom, left:right] = 0
+
+    def op_copy(self, dots, src, x, y, clip):
+        dst, src = self.slices(dots, src, x, y, clip)
+        if dst is not None:
+            dst[...] = src
+
+    def op_blacksrc(self, dots, src, x, y, clip):
+        # black dots of the source are transparent
+        dst, src = self.slices(dots, src, x, y, clip)
+        if dst is not None:
+            numpy.copyto(dst, src, where=(src & 0x0f) != 0)
+
+    def op_add(self, dots, src, x, y, clip):
+        dst, src = self.slices(dots, src, x, y, clip)
+        if dst is not None:
+            dst[...] = numpy.minimum(dst.astype(numpy.int16) + src, 0x0f)
+
+    def op_sub(self, dots, src, x, y, clip):
+        dst, src = self.slices(dots, src, x, y, clip)
+        if dst is not None:
+            dst[...] = numpy.maximum(dst.astype(numpy.int16) - src, 0)
+
+    def op_alpha(self, dots, src, x, y, clip):
+        # the high nibble of the source dot is its opacity
+        dst, src = self.slices(dots, src, x, y, clip)
+        if dst is not None:
+            alpha = (src >> 4).astype(numpy.int16)
+            dst[...] = ((src & 0x0f) * alpha + (dst & 0x0f) * (0x0f - alpha)) // 0x0f
+
+    def stats(self):
+        stats = super(NumpyCompositor, self).stats()
+        stats.update({'conversions': self.conversions, 'fallbacks': self.fallbacks})
+        return stats
+
+
+compositors = {'full': Compositor, 'dirty': DirtyRectCompositor, 'numpy': NumpyCompositor}
+
+def create_compositor(game):
+    """return the compositor selected by dmd_compositor in config.yaml"""
+    name = value_for_key_path('dmd_compositor', 'full')
+    if name == 'numpy' and numpy is None:
+        logging.getLogger('game.dmd').warning('numpy is not installed, using the full compositor')
+        name = 'full'
+    return compositors[name](game)
@@ -0,0 +1,164 @@
+import heapq
+import time
+from weakref import WeakKeyDictionary
+
+class Delayed(object):
+    """A handler delayed by JDMode.delay"""
+
+    def __init__(self, mode, generation, name, time, handler, param):
+        self.mode = mode
+        self.generation = generation
+        self.name = name
+        self.time = time
+        self.handler = handler
+        self.param = param
+        self.cancelled = False
+        self.in_heap = False
+
+
+class DelayScheduler(object):
+    """The delayed handlers of all the modes in one heap ordered by expiration time.
+       The pending handlers are also indexed by mode and name, a cancelled handler is only marked
+       and it is dropped when it reaches the top of the heap. The heap is rebuilt when more than
+       half of it is cancelled.
+
+       Like Mode.dispatch_delayed() called by ModeQueue.tick(), a handler only runs while its mode
+       is in the mode queue. An expired handler of a mode outside the queue is parked until the mode
+       is added again.
+
+       cancel_all() takes constant time, it increments the generation of the mode and the handlers
+       delayed by an older generation are dropped like the cancelled ones.
+    """
+
+    def __init__(self, modes):
+        self.modes = modes
+        self.heap = [] # (time, sequence number, Delayed)
+        self.sequence = 0
+        self.pending = {} # mode -> {name: [Delayed]}
+        self.counts = {} # mode -> number of pending handlers
+        self.heap_counts = {} # mode -> number of pending handlers in the heap, not parked or incoming
+        self.generations = WeakKeyDictionary() # mode -> number of times all its handlers were cancelled
+        self.parked = {} # mode -> [Delayed] expired while the mode was not in the queue
+        self.incoming = None # the entries delayed while dispatching, or None
+        self.num_cancelled = 0 # cancelled entries left in the heap since it was last rebuilt
+        self.fired = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+
+    def delay(self, mode, name, delay, handler, param=None):
+        entry = Delayed(mode, self.generations.get(mode, 0), name, time.time() + delay, handler, param)
+        self.pending.setdefault(mode, {}).setdefault(name, []).append(entry)
+        self.counts[mode] = self.counts.get(mode, 0) + 1
+        if self.incoming != None:
+            # like Mode.dispatch_delayed(), a handler delayed by a handler runs on a later tick at the earliest
+            self.incoming.append(entry)
+        else:
+            self.push(entry)
+
+    def push(self, entry):
+        self.sequence += 1
+        heapq.heappush(self.heap, (entry.time, self.sequence, entry))
+        entry.in_heap = True
+        self.heap_counts[entry.mode] = self.heap_counts.get(entry.mode, 0) + 1
+
+    def pop(self):
+        entry = heapq.heappop(self.heap)[2]
+        entry.in_heap = False
+        if self.is_live(entry):
+            self.heap_counts[entry.mode] -= 1
+        else:
+            self.num_cancelled = max(0, self.num_cancelled - 1)
+        return entry
+
+    def cancel(self, mode, name):
+        """cancel the handlers of the mode delayed under name, or under any name of a list"""
+        names = self.pending.get(mode)
+        if names:
+            for name in (name if isinstance(name, list) else [name]):
+                entries = names.pop(name, [])
+                in_heap = 0
+                for entry in entries:
+                    entry.cancelled = True
+                    if entry.in_heap:
+                        in_heap += 1
+                self.counts[mode] -= len(entries)
+                if in_heap:
+                    # the entries still incoming or parked are not counted in the heap
+                    self.heap_counts[mode] -= in_heap
+                    self.add_cancelled(in_heap)
+            if not names:
+                del self.pending[mode]
+                del self.counts[mode]
+
+    def cancel_all(self, mode):
+        self.generations[mode] = self.generations.get(mode, 0) + 1
+        self.pending.pop(mode, None)
+        self.parked.pop(mode, None)
+        self.counts.pop(mode, None)
+        self.add_cancelled(self.heap_counts.pop(mode, 0))
+
+    def count(self, mode):
+        """return the number of pending handlers of the mode"""
+        return self.counts.get(mode, 0)
+
+    def is_live(self, entry):
+        return not entry.cancelled and entry.generation == self.generations.get(entry.mode, 0)
+
+    def add_cancelled(self, count):
+        """count the entries of the heap that were cancelled"""
+        self.num_cancelled += count
+        if self.num_cancelled > len(self.heap) // 2:
+            self.heap = [item for item in self.heap if self.is_live(item[2])]
+            heapq.heapify(self.heap)
+            self.num_cancelled = 0
+
+    def is_delayed(self, mode, name):
+        names = self.pending.get(mode)
+        return bool(names and names.get(name))
+
+    def mode_added(self, mode):
+        for entry in self.parked.pop(mode, []):
+            if self.is_live(entry):
+                self.push(entry)
+
+    def dispatch(self, now):
+        """run the handlers expired by now"""
+        self.incoming = []
+        try:
+            while self.heap and self.heap[0][0] <= now:
+                entry = self.pop()
+                if not self.is_live(entry):
+                    continue
+                if entry.mode not in self.modes.modes:
+                    self.parked.setdefault(entry.mode, []).append(entry)
+                    continue
+                self.remove_pending(entry)
+                lag = now - entry.time
+                self.fired += 1
+                self.total_lag += lag
+                self.max_lag = max(self.max_lag, lag)
+                if entry.param != None:
+                    entry.handler(entry.param)
+                else:
+                    entry.handler()
+        finally:
+            incoming, self.incoming = self.incoming, None
+            for entry in incoming:
+                if self.is_live(entry):
+                    self.push(entry)
+
+    def remove_pending(self, entry):
+        names = self.pending[entry.mode]
+        entries = names[entry.name]
+        entries.remove(entry)
+        if not entries:
+            del names[entry.name]
+        self.counts[entry.mode] -= 1
+        if not names:
+            del self.pending[entry.mode]
+            del self.counts[entry.mode]
+
+    def stats(self):
+        """the lag is the time between the expiration of a handler and its call"""
+        return {'pending': sum(self.counts.values()), 'fired': self.fired,
+                'max lag': self.max_lag, 'average lag': self.total_lag / self.fired if self.fired else 0.0}
@@ -0,0 +1,87 @@
+import logging
+import time
+import pygame
+from procgame.config import value_for_key_path
+
+class FastDesktopDraw(object):
+    """Replaces Desktop.draw(), which fills one rectangle per dot, with a few whole frame blits.
+       The frame is loaded in a 8-bit palettized surface, scaled to the window size in one operation, and the
+       gaps between the dots are drawn by blitting a cached grid over it. The window is only redrawn when the
+       dots changed since the previous frame.
+    """
+
+    def __init__(self, desktop):
+        self.desktop = desktop
+        # one gray level per brightness, the high nibble of a dot is its opacity and doesn't show on the display
+        self.palette = [(level * 17, level * 17, level * 17) for level in range(16)] * 16
+        self.scaled = None
+        self.grid = None
+        self.last_data = None
+        self.draws = 0
+        self.skipped = 0
+        self.draw_time = 0.0
+        self.stats_interval = value_for_key_path('dmd_stats_interval', 0)
+        self.stats_start = None
+        self.logger = logging.getLogger('game.desktop')
+
+    def install(self):
+        self.desktop.draw = self.draw
+
+    def draw(self, frame):
+        data = frame.get_data()
+        if data == self.last_data:
+            self.skipped += 1
+            return
+        start_time = time.time()
+        self.last_data = data
+
+        screen = pygame.display.get_surface()
+        size = (frame.width, frame.height)
+        if self.scaled is None or self.scaled.get_size() != screen.get_size():
+            self.create_surfaces(size, screen.get_size())
+
+        dots = pygame.image.fromstring(data, size, 'P')
+        dots.set_palette(self.palette)
+        pygame.transform.scale(dots, self.scaled.get_size(), self.scaled)
+        screen.blit(self.scaled, (0, 0))
+        if self.grid != None:
+            screen.blit(self.grid, (0, 0))
+        pygame.display.update()
+
+        self.draw_time += time.time() - start_time
+        self.draws += 1
+        if self.stats_interval:
+            self.log_stats()
+
+    def create_surfaces(self, size, screen_size):
+        # the scale destination must have the depth and the palette of the source
+        self.scaled = pygame.Surface(screen_size, 0, 8)
+        self.scaled.set_palette(self.palette)
+
+        # like Desktop.draw(), leave a one pixel black border around each dot when the dots are large enough
+        scale = screen_size[0] // size[0]
+        self.grid = None
+        if scale >= 3:
+            transparent = (255, 0, 255)
+            self.grid = pygame.Surface(screen_size)
+            self.grid.fill(transparent)
+            for x in range(size[0]):
+                self.grid.fill((0, 0, 0), (x * scale + scale - 1, 0, 1, screen_size[1]))
+            for y in range(size[1]):
+                self.grid.fill((0, 0, 0), (0, y * scale + scale - 1, screen_size[0], 1))
+            self.grid.set_colorkey(transparent, pygame.RLEACCEL)
+
+    def log_stats(self):
+        now = time.time()
+        if self.stats_start is None:
+            self.stats_start = (now, self.draws, self.skipped, self.draw_time)
+            return
+        start_time, start_draws, start_skipped, start_draw_time = self.stats_start
+        elapsed = now - start_time
+        if elapsed < self.stats_interval:
+            return
+        draws = self.draws - start_draws
+        self.logger.info('desktop dmd: %.1f draws per second, %.2f ms per draw, %d unchanged frames skipped',
+                         draws / elapsed, (self.draw_time - start_draw_time) * 1000 / draws if draws else 0.0,
+                         self.skipped - start_skipped)
+        self.stats_start = (now, self.draws, self.skipped, self.draw_time)
@@ -0,0 +1,61 @@
+from procgame.dmd import Font, Frame
+
+class AtlasFont(Font):
+    """A Font with its glyphs packed side by side in a single atlas, and tables indexed by character code.
+       Measuring text is a sum over the advance table and drawing it is a run of copy_rect, one per glyph.
+       The .dmd fonts have no kerning information, the advance of a glyph is its width plus the tracking.
+    """
+
+    def __init__(self, font):
+        super(AtlasFont, self).__init__()
+        self.char_size = font.char_size
+        self.char_widths = list(font.char_widths)
+        self.composite_op = font.composite_op
+
+        # the .dmd font has 96 glyphs starting at the space character, in rows of 10 cells of char_size x char_size
+        self.glyph_x = [None] * 256
+        self.glyph_width = [0] * 256
+        self.bitmap = Frame(max(1, sum(self.char_widths)), self.char_size)
+        x = 0
+        for char_offset, width in enumerate(self.char_widths):
+            Frame.copy_rect(dst=self.bitmap, dst_x=x, dst_y=0, src=font.bitmap,
+                            src_x=self.char_size * (char_offset % 10), src_y=self.char_size * (char_offset // 10),
+                            width=width, height=self.char_size, op='copy')
+            self.glyph_x[32 + char_offset] = x
+            self.glyph_width[32 + char_offset] = width
+            x += width
+        self.tracking = font.tracking
+
+    @property
+    def tracking(self):
+        return self._tracking
+
+    @tracking.setter
+    def tracking(self, tracking):
+        self._tracking = tracking
+        # Font.__init__ sets the tracking before the glyph tables exist
+        if 'glyph_x' in self.__dict__:
+            # characters outside the font are skipped, they don't advance
+            self.advance = [0 if glyph_x is None else width + tracking for glyph_x, width in zip(self.glyph_x, self.glyph_width)]
+
+    def size(self, text):
+        if not isinstance(text, str):
+            text = text.encode('ascii', 'ignore')
+        return (sum(map(self.advance.__getitem__, map(ord, text))), self.char_size)
+
+    def draw(self, frame, text, x, y):
+        if not isinstance(text, str):
+            text = text.encode('ascii', 'ignore')
+        copy_rect = Frame.copy_rect
+        bitmap = self.bitmap
+        height = self.char_size
+        op = self.composite_op
+        for index in map(ord, text):
+            glyph_x = self.glyph_x[index]
+            if glyph_x is None:
+                continue
+            width = self.glyph_width[index]
+            if width:
+                copy_rect(frame, x, y, bitmap, glyph_x, 0, width, height, op)
+            x += self.advance[index]
+        return x
@@ -0,0 +1,114 @@
+import logging
+import time
+import pinproc
+from procgame.config import value_for_key_path
+
+class ScheduledRunLoop(object):
+    """A replacement for GameController.run_loop() that polls the switches, ticks the modes and renders
+       the DMD frames at separate rates.
+       The switch events come first. A DMD frame is only rendered when it is expected to finish before
+       the next switch poll is late by more than switch_latency, otherwise it is skipped. The display still
+       gets a frame at least every max_frame_delay seconds so it never freezes.
+       The DMD frame requests that pile up while a frame is rendered are coalesced into a single frame.
+    """
+
+    # seconds without a new DMD frame before one is rendered even if it delays the switches
+    max_frame_delay = 0.25
+
+    def __init__(self, game):
+        self.game = game
+        self.poll_interval = 1.0 / value_for_key_path('switch_poll_rate', 1000)
+        self.tick_interval = 1.0 / value_for_key_path('mode_tick_rate', 200)
+        self.frame_interval = 1.0 / value_for_key_path('dmd_frame_rate', 60)
+        self.switch_latency = value_for_key_path('switch_latency', 0.004)
+        self.stats_interval = value_for_key_path('loop_stats_interval', 0)
+        self.logger = logging.getLogger('game.loop')
+
+        self.frame_requests = 0
+        self.frame_cost = 0.0 # moving average of the seconds spent rendering a frame
+        self.counts = {'switch polls': 0, 'switch events': 0, 'mode ticks': 0, 'dmd frames': 0, 'dmd frames skipped': 0}
+        self.stats_start = None
+
+    def run(self):
+        game = self.game
+        game.done = False
+        now = time.time()
+        next_poll = next_tick = next_frame = now
+        last_frame_time = now
+        self.stats_start = (now, dict(self.counts))
+        run_start = self.stats_start
+        try:
+            while not game.done:
+                now = time.time()
+                if now >= next_poll:
+                    self.poll_switches()
+                    next_poll = max(next_poll + self.poll_interval, now)
+
+                now = time.time()
+                if now >= next_tick:
+                    self.tick()
+                    next_tick = max(next_tick + self.tick_interval, now)
+
+                now = time.time()
+                if self.frame_requests and now >= next_frame:
+                    if now + self.frame_cost <= next_poll + self.switch_latency or now - last_frame_time >= self.max_frame_delay:
+                        self.render_frame()
+                        last_frame_time = now
+                        next_frame = max(next_frame + self.frame_interval, now)
+                        continue
+
+                if self.stats_interval and now - self.stats_start[0] >= self.stats_interval:
+                    self.log_rates(self.stats_start)
+                    self.stats_start = (now, dict(self.counts))
+
+                delay = min(next_poll, next_tick) - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+        finally:
+            self.log_rates(run_start)
+            if game.proc:
+                game.proc.reset(1)
+            game.end_run_loop()
+
+    def poll_switches(self):
+        game = self.game
+        self.counts['switch polls'] += 1
+        events = game.get_events()
+        for event in events:
+            if event['type'] == pinproc.EventTypeDMDFrameDisplayed:
+                # the DMD has room for another frame, render it when the switches allow it
+                self.frame_requests += 1
+            else:
+                self.counts['switch events'] += 1
+                game.process_event(event)
+        if events and game.proc:
+            # send the driver commands of the switch handlers now rather than at the next tick
+            game.proc.flush()
+
+    def tick(self):
+        game = self.game
+        self.counts['mode ticks'] += 1
+        game.tick()
+        game.tick_virtual_drivers()
+        game.modes.tick()
+        if game.proc:
+            game.proc.watchdog_tickle()
+            game.proc.flush()
+
+    def render_frame(self):
+        start_time = time.time()
+        self.game.dmd_event()
+        self.frame_cost = 0.8 * self.frame_cost + 0.2 * (time.time() - start_time)
+        self.counts['dmd frames'] += 1
+        # the other requests were coalesced into this frame
+        self.counts['dmd frames skipped'] += self.frame_requests - 1
+        self.frame_requests = 0
+
+    def log_rates(self, start):
+        """log the achieved rate of each task since start"""
+        start_time, start_counts = start
+        elapsed = time.time() - start_time
+        if elapsed <= 0:
+            return
+        rates = ['%.1f %s' % ((self.counts[key] - start_counts[key]) / elapsed, key) for key in sorted(self.counts)]
+        self.logger.info('run loop: %s per second, %.1f ms per dmd frame', ', '.join(rates), self.frame_cost * 1000)
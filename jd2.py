@@ -1,18 +1,22 @@
 from math import ceil
+import argparse
 import logging
 import os
 import pygame.locals
 import pinproc
 from procgame.config import value_for_key_path
 from procgame.dmd import FrameLayer, MarkupFrameGenerator, ScriptedLayer
-from procgame.game import BasicGame, Mode, Player
+from procgame.game import BasicGame, Player
 from procgame.highscore import HighScoreCategory
 from procgame.lamps import LampController
 from procgame.modes import BallSave, Trough
 from procgame.service import ServiceMode
-from procgame.sound import SoundController
 from asset_loader import AssetLoader
-from layers import DontMoveTransition, FixedSizeTextLayer, GroupedTransition, SlideTransition
+from compositor import create_compositor
+from desktop_dmd import FastDesktopDraw
+from game_loop import ScheduledRunLoop
+from layers import DontMoveTransition, GroupedTransition, MessageLayer, SlideTransition, compose_group
+from mode_queue import DelayTracking, JDMode, JDModeQueue
 from my_modes.attract import Attract
 from my_modes.ballsearch import JDBallSearch
 from my_modes.base import BasePlay
@@ -21,6 +25,8 @@ from my_modes.drain import DrainMode
 from my_modes.initials import JDEntrySequenceManager
 from my_modes.switchmonitor import SwitchMonitor
 from my_modes.tilt import SlamTilted, Tilted
+from sounds import JDSoundController
+from startup_profiler import profiler
 
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
@@ -30,13 +36,23 @@ game_data_path = curr_file_path + '/config/game_data.yaml'
 game_data_template_path = curr_file_path + '/config/game_data_template.yaml'
 settings_template_path = curr_file_path + '/config/settings_template.yaml'
 
-class JDServiceMode(ServiceMode):
+class JDServiceMode(DelayTracking, ServiceMode):
 
     def mode_stopped(self):
         super(JDServiceMode, self).mode_stopped()
         self.game.service_mode_ended()
 
 
+class JDBallSave(DelayTracking, BallSave):
+    """The procgame BallSave, its delayed handlers are cancelled when it is torn down"""
+    pass
+
+
+class JDTrough(DelayTracking, Trough):
+    """The procgame Trough, its delayed handlers are cancelled when it is torn down"""
+    pass
+
+
 
 class JDPlayer(Player):
     """Keeps the progress of one player to allow the player
@@ -57,29 +73,51 @@ class JD2Game(BasicGame):
     """Judge Dredd pinball game"""
 
     def __init__(self):
-        super(JD2Game, self).__init__(pinproc.MachineTypeWPC)
+        with profiler.section('BasicGame.__init__'):
+            super(JD2Game, self).__init__(pinproc.MachineTypeWPC)
+
+        # no mode is added yet, index the handlers of the modes from the start
+        self.modes = JDModeQueue(self)
 
         # a text layer for status messages, same size and location as the status line at the bottom of the score display
         self.dmd.message_layer = self.create_message_layer()
 
-        self.sound = SoundController(self)
+        self.sound = JDSoundController(self)
         self.lampctrl = LampController(self)
         self.logging_enabled = False
 
         # don't use the locale, always insert commas in groups of 3 digits
         self.score_display.format_score = self.format_points
 
-        self.load_config('config/JD.yaml')
+        # functions called after the score changes
+        self.score_listeners = [self.invalidate_score_display]
+
+        # the score display rebuilds its layers on every frame, only do it when what it shows changes
+        self.score_display_signature = None
+        self.score_display.layer.next_frame = self.score_display_next_frame
+        self.score_display.layer.stable_frames = True
+
+        self.compositor = create_compositor(self)
+        self.compositor.install()
+
+        if getattr(self, 'desktop', None) != None and value_for_key_path('desktop_dmd_draw', 'dots') == 'fast':
+            FastDesktopDraw(self.desktop).install()
+
+        with profiler.section('load_config'):
+            self.load_config('config/JD.yaml')
         self.lamp_schedules = {'slow':0x00ff00ff, 'medium':0x0f0f0f0f, 'fast':0x55555555, 'on':0xffffffff, 'off':0x00000000}
-        self.create_high_score_categories()
+        with profiler.section('create_high_score_categories'):
+            self.create_high_score_categories()
 
-        # Assets
-        asset_loader = AssetLoader(self)
-        asset_loader.load_assets(curr_file_path)
-        self.animations = asset_loader.animations
-        self.fonts = asset_loader.fonts
+        # Assets, only the boot tier is loaded now, the other tiers are loaded in the background while attract runs
+        self.asset_loader = AssetLoader(self)
+        with profiler.section('load_assets'):
+            self.asset_loader.load_assets(curr_file_path)
+        self.animations = self.asset_loader.animations
+        self.fonts = self.asset_loader.fonts
 
-        self.reset()
+        with profiler.section('reset'):
+            self.reset()
 
     # override load_config to allow pygame key names and pygame numeric keys in the key_map
     def load_config(self, path):
@@ -140,9 +178,9 @@ class JD2Game(BasicGame):
         # Trough
         trough_switchnames = ['trough1', 'trough2', 'trough3', 'trough4', 'trough5', 'trough6']
         early_save_switchnames = ['outlaneL', 'outlaneR']
-        self.ball_save = BallSave(self, self.lamps.drainShield, 'shooterR')
+        self.ball_save = JDBallSave(self, self.lamps.drainShield, 'shooterR')
         self.ball_save.disable()
-        self.trough = Trough(self, trough_switchnames, 'trough6', 'trough', early_save_switchnames, 'shooterR', self.no_op_callback)
+        self.trough = JDTrough(self, trough_switchnames, 'trough6', 'trough', early_save_switchnames, 'shooterR', self.no_op_callback)
         self.trough.ball_save_callback = self.ball_save.launch_callback
         self.trough.num_balls_to_save = self.ball_save.get_num_balls_to_save
         self.ball_save.trough_enable_ball_save = self.trough.enable_ball_save
@@ -165,6 +203,16 @@ class JD2Game(BasicGame):
         self.disable_game()
         self.remove_all_modes()
 
+    def run_loop(self, min_seconds_per_cycle=None):
+        if value_for_key_path('run_loop', 'basic') == 'scheduled':
+            ScheduledRunLoop(self).run()
+        else:
+            super(JD2Game, self).run_loop(min_seconds_per_cycle)
+
+    def tick(self):
+        super(JD2Game, self).tick()
+        self.asset_loader.commit_pending()
+
     # Empty callback
     def no_op_callback(self):
         pass
@@ -175,30 +223,27 @@ class JD2Game(BasicGame):
     
     def create_message_layer(self):
         """return a text layer at the bottom of the screen where the last line of the score display normally goes"""
-        layer = FixedSizeTextLayer(128/2, 32-6, self.dmd.message_layer.font, 'center', opaque=False, width=128, height=6)
-
         # slide in for 0.5s, stay still for 2s, slide out for 0.5s
         slide_in_transition = SlideTransition(direction='west')
         dont_move_transition = DontMoveTransition()
         dont_move_transition.progress_per_frame = 1.0 / 120.0
         slide_out_transition = SlideTransition(direction='west')
         slide_out_transition.in_out = 'out'
+        grouped_transition = GroupedTransition([slide_in_transition, dont_move_transition, slide_out_transition])
 
-        layer.grouped_transition = GroupedTransition([slide_in_transition, dont_move_transition, slide_out_transition])
-        layer.grouped_transition.completed_handler = self.message_transition_completed
+        # the transition frames are rendered once per message and played back from a cache
+        layer = MessageLayer(128/2, 32-6, self.dmd.message_layer.font, grouped_transition, 'center', opaque=False, width=128, height=6)
+        layer.completed_handler = self.message_transition_completed
         return layer
 
     def set_status(self, text=None, scroll=True):
         # when text is None, that effectively turns off the layer and transitions are not called
         if scroll:
             # text slides in, stays for a while and then slides out
-            self.dmd.message_layer.set_text(text)
-            self.dmd.message_layer.transition = self.dmd.message_layer.grouped_transition
-            self.dmd.message_layer.transition.start()
+            self.dmd.message_layer.play(text)
         else:
             # text does not move
             self.dmd.message_layer.set_text(text, seconds=3)
-            self.dmd.message_layer.transition = None
 
     def message_transition_completed(self):
         self.dmd.message_layer.set_text(None)
@@ -239,7 +284,10 @@ class JD2Game(BasicGame):
     #
 
     def start_game(self, supergame):
+        # the game assets are usually ready long before the start button is pressed
+        self.asset_loader.wait_for_tier('game')
         super(JD2Game, self).start_game()
+        self.invalidate_score_display()
         self.game_data['Audits']['Games Started'] += 1
         self.supergame = supergame
         self.remove_modes([self.attract])
@@ -330,21 +378,14 @@ class JD2Game(BasicGame):
 
     def remove_modes(self, mode_list):
         for mode in mode_list:
-            self.modes.remove(mode)
-            # cancel all delayed handlers
-            mode._Mode__delayed = []
+            # cancel all delayed handlers and timed switch handlers
+            self.modes.teardown(mode)
 
     def remove_all_modes(self):
         self.remove_modes(self.modes[:])
 
     def send_event(self, event):
-        for mode in self.modes[:]:
-            handler = getattr(mode, event, None)
-            if handler:
-                ret = handler()
-                if ret:
-                    # skip lower priority modes
-                    return ret
+        return self.modes.send_event(event)
 
     #
     # Tilt
@@ -393,6 +434,7 @@ class JD2Game(BasicGame):
         # read other game settings
         self.balls_per_game = self.user_settings['Gameplay']['Balls per game']
         self.score_display.set_left_players_justify(self.user_settings['Display']['Left side score justify'])
+        self.invalidate_score_display()
 
         num_blocks_setting = int(self.user_settings['Gameplay']['Blocks for Ultimate Challenge'])
         self.blocks_required = min(16, 4 * ceil(num_blocks_setting / 4)) # a multiple of 4 less than or equal to 16
@@ -457,7 +499,7 @@ class JD2Game(BasicGame):
 
     def highscore_entry_ready_to_prompt(self, mode, prompt):
         self.sound.play_voice('high score')
-        banner_mode = Mode(game=self, priority=8)
+        banner_mode = JDMode(game=self, priority=8)
         markup = MarkupFrameGenerator()
         text = '\n#GREAT JOB#\n[%s]' % (prompt.left.upper()) # we know that the left is the player name
         frame = markup.frame_for_markup(markup=text, y_offset=0)
@@ -485,6 +527,22 @@ class JD2Game(BasicGame):
 
         self.save_game_data(game_data_path)
 
+    def score(self, points):
+        super(JD2Game, self).score(points)
+        for listener in self.score_listeners:
+            listener()
+
+    def invalidate_score_display(self):
+        self.score_display_signature = None
+
+    def score_display_next_frame(self):
+        signature = (len(self.players), self.current_player_index, self.ball)
+        if signature != self.score_display_signature:
+            self.score_display_signature = signature
+            self.score_display.update_layer()
+        # skip the update_layer() call in ScoreLayer.next_frame, and keep the frame while the text layers don't change
+        return compose_group(self.score_display.layer)
+
     def format_points(self, points):
         # disregard the locale, always insert commas between groups of 3 digits
         return '00' if points == 0 else '{:,}'.format(points)
@@ -567,10 +625,24 @@ class JD2Game(BasicGame):
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Judge Dredd pinball game')
+    parser.add_argument('--profile-startup', metavar='PREFIX',
+                        help='record the startup time in PREFIX.json and PREFIX.folded (flame graph stacks)')
+    parser.add_argument('--exit-after-startup', action='store_true', help='exit instead of running the game loop')
+    args = parser.parse_args()
+
     game = None
     try:
-        game = JD2Game()
-        game.run_loop()
+        if args.profile_startup:
+            profiler.start()
+        with profiler.section('JD2Game'):
+            game = JD2Game()
+        if args.profile_startup:
+            profiler.stop()
+            profiler.write_json(args.profile_startup + '.json')
+            profiler.write_folded(args.profile_startup + '.folded')
+        if not args.exit_after_startup:
+            game.run_loop()
     finally:
         del game
 
@@ -1,41 +1,169 @@
 import time
-from procgame.dmd import Frame, LayerTransitionBase, PanningLayer, TextLayer
+from collections import OrderedDict
+from procgame import dmd
+from procgame.dmd import AnimatedLayer, Frame, FrameLayer, FrameQueueLayer, LayerTransitionBase, PanningLayer
 
-class FixedSizeTextLayer(TextLayer):
-    """A TextLayer where the text and blank blinking frames are opaque over the whole fixed width x height"""
+#
+# A layer has stable frames when its next_frame() returns a different frame whenever its output changes
+# and never modifies a frame it returned before. The output of such a layer is known to be unchanged
+# while it keeps returning the same frame. The other layers are assumed to change on every frame.
+#
 
-    def __init__(self, x, y, font, justify='left', opaque=False, width=128, height=32, fill_color=None):
-        super(FixedSizeTextLayer, self).__init__(x, y, font, justify, opaque, width, height, fill_color)
-        self.blank_frame = Frame(width, height)
+# procgame layers with stable frames, as long as nobody draws into the frame of a FrameLayer
+stable_layer_types = (AnimatedLayer, FrameLayer, FrameQueueLayer, dmd.TextLayer)
+
+def has_stable_frames(layer):
+    return getattr(layer, 'stable_frames', False) or type(layer) in stable_layer_types
+
+def placement(layer, frame):
+    """return how the frame of the layer is composited: the frame, its position and the composite op"""
+    return (frame, layer.target_x + layer.target_x_offset, layer.target_y + layer.target_y_offset, layer.composite_op)
+
+def same_placements(placements, other_placements):
+    if other_placements is None or len(placements) != len(other_placements):
+        return False
+    for (frame, x, y, op), (other_frame, other_x, other_y, other_op) in zip(placements, other_placements):
+        if frame is not other_frame or x != other_x or y != other_y or op != other_op:
+            return False
+    return True
+
+def composite(layer, frame, target):
+    """composite the frame returned by layer.next_frame() onto target, like Layer.composite_next"""
+    if layer.transition != None:
+        frame = layer.transition.next_frame(from_frame=target, to_frame=frame)
+    Frame.copy_rect(dst=target, dst_x=layer.target_x + layer.target_x_offset, dst_y=layer.target_y + layer.target_y_offset,
+                    src=frame, src_x=0, src_y=0, width=frame.width, height=frame.height, op=layer.composite_op)
+
+def visible_layers(group):
+    """return the layers of a GroupedLayer from the top opaque layer up, like GroupedLayer.next_frame the layers below it are hidden"""
+    layers = []
+    for layer in reversed(group.layers):
+        layers.append(layer)
+        if layer.opaque:
+            break
+    layers.reverse()
+    return layers
+
+def compose_group(group):
+    """next_frame() of a GroupedLayer that returns its previous frame when the frames of its layers did not change"""
+    layers = [layer for layer in visible_layers(group) if layer.enabled]
+    if not layers:
+        return None
+    frames = [(layer, layer.next_frame()) for layer in layers]
+    frames = [(layer, frame) for layer, frame in frames if frame != None]
+    if not frames:
+        # like GroupedLayer.next_frame(), a group with nothing to composite is transparent
+        return None
+    cacheable = all(layer.transition == None and has_stable_frames(layer) for layer, frame in frames)
+    placements = [placement(layer, frame) for layer, frame in frames]
+    if cacheable and same_placements(placements, getattr(group, 'composed_from', None)):
+        return group.composed
+
+    composed = Frame(group.width, group.height)
+    fill_color = getattr(group, 'fill_color', None)
+    if fill_color != None:
+        composed.fill_rect(0, 0, group.width, group.height, fill_color)
+    for layer, frame in frames:
+        composite(layer, frame, composed)
+    group.composed = composed
+    group.composed_from = placements if cacheable else None
+    return composed
+
+class TextFrameCache(object):
+    """A LRU of the frames rendered by the text layers, shared by all of them.
+       The cached frames are shared, they must not be modified.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict() # least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries[key] = entry # most recently used
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+text_frame_cache = TextFrameCache(256)
+
+
+class TextLayer(dmd.TextLayer):
+    """A TextLayer that takes its rendered frames from the shared text_frame_cache"""
+
+    stable_frames = True
 
     def set_text(self, text, seconds=None, blink_frames=None):
         """Displays the given message for the given number of seconds."""
+        if text == None:
+            return super(TextLayer, self).set_text(text, seconds, blink_frames)
+
+        # with a fill color, the text is drawn at x, y in a frame filled over width x height
+        key = (type(self), self.font, text, self.justify, self.x, self.y, self.width, self.height, self.fill_color)
+        entry = text_frame_cache.get(key)
+        if entry is None:
+            entry = self.render(text)
+            text_frame_cache.put(key, entry)
+
         self.started_at = None
         self.seconds = seconds
         self.blink_frames = blink_frames
         self.blink_frames_counter = self.blink_frames
+        (self.frame, target_x, target_y, self.target_x_offset, self.target_y_offset) = entry
+        self.set_target_position(target_x, target_y)
+        return self
 
-        if text == None:
-            self.frame = None
-        else:
-            (w, h) = self.font.size(text)
-            if self.justify == 'right':
-                (x, y) = (self.width - w, 0)
-                (self.target_x_offset, self.target_y_offset) = (-self.width, 0)
-            elif self.justify == 'center':
-                (x, y) = ((self.width - w)/2, 0)
-                (self.target_x_offset, self.target_y_offset) = (-self.width/2, 0)
-            else: # left justified
-                (x, y) = (0,0)
-                (self.target_x_offset, self.target_y_offset) = (0, 0)
-
-            self.set_target_position(self.x, self.y)
-            self.frame = Frame(width=self.width, height=self.height)
-            if self.fill_color != None:
-                self.frame.fill_rect(0, 0, self.width, self.height, self.fill_color)
-            self.font.draw(self.frame, text, x, y)
+    def render(self, text):
+        """return the frame showing the text, its target position and its target offsets"""
+        super(TextLayer, self).set_text(text)
+        return (self.frame, self.target_x, self.target_y, self.target_x_offset, self.target_y_offset)
 
-        return self
+
+class GroupedLayer(dmd.GroupedLayer):
+    """A GroupedLayer with stable frames, it only composites its layers when one of their frames changed"""
+
+    stable_frames = True
+
+    def next_frame(self):
+        return compose_group(self)
+
+
+class FixedSizeTextLayer(TextLayer):
+    """A TextLayer where the text and blank blinking frames are opaque over the whole fixed width x height"""
+
+    def __init__(self, x, y, font, justify='left', opaque=False, width=128, height=32, fill_color=None):
+        super(FixedSizeTextLayer, self).__init__(x, y, font, justify, opaque, width, height, fill_color)
+        self.blank_frame = Frame(width, height)
+
+    def render(self, text):
+        (w, h) = self.font.size(text)
+        if self.justify == 'right':
+            (x, y) = (self.width - w, 0)
+            (target_x_offset, target_y_offset) = (-self.width, 0)
+        elif self.justify == 'center':
+            (x, y) = ((self.width - w)/2, 0)
+            (target_x_offset, target_y_offset) = (-self.width/2, 0)
+        else: # left justified
+            (x, y) = (0,0)
+            (target_x_offset, target_y_offset) = (0, 0)
+
+        frame = Frame(width=self.width, height=self.height)
+        if self.fill_color != None:
+            frame.fill_rect(0, 0, self.width, self.height, self.fill_color)
+        self.font.draw(frame, text, x, y)
+        return (frame, self.x, self.y, target_x_offset, target_y_offset)
 
     def next_frame(self):
         if self.started_at == None:
@@ -55,12 +183,107 @@ class FixedSizeTextLayer(TextLayer):
         return self.frame
 
 
+class MessageLayer(FixedSizeTextLayer):
+    """A FixedSizeTextLayer that plays a message with a transition from a sequence of frames rendered once per text.
+       The transition must not depend on the frame below the layer, like SlideTransition and DontMoveTransition.
+       A sequence is a list of (frame, count) where count is the number of consecutive times the frame is shown.
+    """
+
+    def __init__(self, x, y, font, transition, justify='left', opaque=False, width=128, height=32, fill_color=None, cache_size=32):
+        super(MessageLayer, self).__init__(x, y, font, justify, opaque, width, height, fill_color)
+        self.message_transition = transition
+        self.completed_handler = None
+        self.sequences = OrderedDict() # text -> sequence, least recently used first
+        self.cache_size = cache_size
+        self.sequence = None
+        self.index = 0
+        self.count = 0
+
+    def play(self, text):
+        """show the text with the transition, then call completed_handler"""
+        self.set_text(text)
+        if text == None:
+            return
+        self.transition = None
+        sequence = self.sequences.pop(text, None)
+        if sequence is None:
+            sequence = self.render_sequence(self.frame)
+            if len(self.sequences) >= self.cache_size:
+                self.sequences.popitem(last=False)
+        self.sequences[text] = sequence # most recently used
+        self.sequence = sequence
+        self.index = 0
+        self.count = 0
+
+    def render_sequence(self, text_frame):
+        """run the transition to completion and record its frames"""
+        done = []
+        handler = self.message_transition.completed_handler
+        self.message_transition.completed_handler = lambda: done.append(True)
+        try:
+            self.message_transition.start()
+            blank_frame = Frame(self.width, self.height)
+            sequence = []
+            last_data = None
+            while not done and len(sequence) < 10000:
+                frame = self.message_transition.next_frame(from_frame=blank_frame, to_frame=text_frame)
+                data = frame.get_data()
+                if data == last_data:
+                    sequence[-1][1] += 1
+                else:
+                    # the transitions reuse their frames, keep a copy
+                    sequence.append([frame if frame is text_frame else frame.copy(), 1])
+                    last_data = data
+        finally:
+            self.message_transition.completed_handler = handler
+        return [tuple(item) for item in sequence]
+
+    def set_text(self, text, seconds=None, blink_frames=None):
+        self.sequence = None
+        return super(MessageLayer, self).set_text(text, seconds, blink_frames)
+
+    def next_frame(self):
+        if self.sequence is None:
+            return super(MessageLayer, self).next_frame()
+        frame, count = self.sequence[self.index]
+        self.count += 1
+        if self.count == count:
+            self.index += 1
+            self.count = 0
+            if self.index == len(self.sequence):
+                self.sequence = None
+                if self.completed_handler != None:
+                    self.completed_handler()
+        return frame
+
+
 class FastPanningLayer(PanningLayer):
     """Pans faster than the regular PanningLayer"""
     def next_frame(self):
         self.tick += 2
         return super(FastPanningLayer, self).next_frame()
 
+class FrameBuffers(object):
+    """Two frames of the same size used alternately, the frame returned last is not modified until the next call"""
+
+    # number of frames allocated by all the FrameBuffers, it stays the same once the transitions are running
+    allocations = 0
+
+    def __init__(self):
+        self.frames = []
+        self.current = 0
+
+    def next_frame(self, width, height):
+        """return a blank frame of the given size"""
+        if not self.frames or self.frames[0].width != width or self.frames[0].height != height:
+            self.frames = [Frame(width, height), Frame(width, height)]
+            FrameBuffers.allocations += 2
+        self.current = 1 - self.current
+        frame = self.frames[self.current]
+        frame.clear()
+        return frame
+
+
 class SlideTransition(LayerTransitionBase):
     """A transition that scrolls the to_frame over a blank frame"""
 
@@ -68,13 +291,18 @@ class SlideTransition(LayerTransitionBase):
         super(SlideTransition, self).__init__()
         self.direction = direction
         self.progress_per_frame = 1.0/20.0
+        self.blank_frame = None
+        self.buffers = FrameBuffers()
 
     def next_frame(self, from_frame, to_frame):
-        blank_frame = Frame(to_frame.width, to_frame.height)
-        return super(SlideTransition, self).next_frame(blank_frame, to_frame)
+        if self.blank_frame == None or self.blank_frame.width != to_frame.width or self.blank_frame.height != to_frame.height:
+            # never drawn into, it can be returned as is
+            self.blank_frame = Frame(to_frame.width, to_frame.height)
+            FrameBuffers.allocations += 1
+        return super(SlideTransition, self).next_frame(self.blank_frame, to_frame)
 
     def transition_frame(self, from_frame, to_frame):
-        frame = Frame(width=to_frame.width, height=to_frame.height)
+        frame = self.buffers.next_frame(to_frame.width, to_frame.height)
         prog = -self.progress if self.in_out == 'out' else 1.0 - self.progress
         dst_x, dst_y = {
          'north': (0,  prog*frame.height),
@@ -0,0 +1,291 @@
+import logging
+import time
+from weakref import WeakSet
+import pinproc
+from procgame.game import Mode, ModeQueue, SwitchStop
+from delay_scheduler import DelayScheduler
+from timing_wheel import TimingWheel
+
+# the switch event types of a switch that closed
+closed_event_types = [pinproc.EventTypeSwitchClosedDebounced, pinproc.EventTypeSwitchClosedNondebounced]
+
+class SwitchHandler(object):
+    """A switch handler added to a JDMode by add_switch_handler()"""
+
+    def __init__(self, name, closed, delay, handler, param):
+        self.name = name
+        self.closed = closed # True for the events of the switch closing, False for the switch opening
+        self.delay = delay
+        self.handler = handler
+        self.param = param
+
+    def same_as(self, other):
+        return (self.name, self.closed, self.delay, self.handler) == (other.name, other.closed, other.delay, other.handler)
+
+
+class JDMode(Mode):
+    """A Mode that records its switch handlers so JDModeQueue can index them.
+       The other modes are passed every switch event like in ModeQueue.
+
+       JDModeQueue arms the sw_<name>_<state>_for_<time> handlers in its timing wheel rather than in the mode.
+       Like with Mode.handle_event, they are delayed under the name of their switch: cancel_delayed() and
+       is_delayed() with the switch name also cancel or find them.
+
+       delay() keeps the handlers in the DelayScheduler of the JDModeQueue rather than in the mode.
+
+       Adding a switch handler or assigning an evt_<name> handler or handle_event clears the index of the JDModeQueue,
+       so a handler added while the mode is in the queue, in mode_started() for example, is seen by the next event.
+    """
+
+    def __init__(self, game, priority):
+        # Mode.__init__ adds the handlers of the sw_<name>_<state> methods
+        self.switch_handlers = []
+        super(JDMode, self).__init__(game, priority)
+
+    def add_switch_handler(self, name, event_type, delay=None, handler=None):
+        super(JDMode, self).add_switch_handler(name=name, event_type=event_type, delay=delay, handler=handler)
+        sw = self.game.switches[name]
+        if event_type in ['active', 'inactive']:
+            # like Mode.add_switch_handler, an NC switch is active when it is open
+            closed = (event_type == 'active') != (sw.type == 'NC')
+        else:
+            closed = event_type == 'closed'
+        switch_handler = SwitchHandler(name, closed, delay, handler, sw)
+        if not any(switch_handler.same_as(other) for other in self.switch_handlers):
+            self.switch_handlers.append(switch_handler)
+            # a mode can add a switch handler while it is in the queue, the index must see it
+            self.invalidate_index()
+
+    def __setattr__(self, name, value):
+        super(JDMode, self).__setattr__(name, value)
+        if name.startswith('evt_') or name == 'handle_event':
+            self.invalidate_index()
+
+    def __delattr__(self, name):
+        super(JDMode, self).__delattr__(name)
+        if name.startswith('evt_') or name == 'handle_event':
+            self.invalidate_index()
+
+    def invalidate_index(self):
+        """clear the index of the JDModeQueue, the handlers of the mode changed"""
+        modes = self.mode_queue()
+        if modes != None:
+            modes.invalidate()
+
+    def mode_queue(self):
+        """return the JDModeQueue of the game, or None"""
+        modes = getattr(self.game, 'modes', None)
+        return modes if isinstance(modes, JDModeQueue) else None
+
+    def delay(self, name, event_type, delay, handler, param=None):
+        modes = self.mode_queue()
+        # the handlers delayed with an event type are the sw_<name>_<state>_for_<time> handlers of a mode
+        # overriding handle_event, Mode.handle_event() cancels them in the mode itself
+        if event_type != None or modes is None:
+            return super(JDMode, self).delay(name, event_type, delay, handler, param)
+        if __debug__ and self in modes.torn_down:
+            modes.logger.warning('%s delayed %s after its teardown', type(self).__name__, name)
+        modes.scheduler.delay(self, name, delay, handler, param)
+
+    def cancel_delayed(self, name):
+        super(JDMode, self).cancel_delayed(name)
+        modes = self.mode_queue()
+        if modes != None:
+            modes.cancel_switch_timers(self, name)
+            modes.scheduler.cancel(self, name)
+
+    def is_delayed(self, name):
+        modes = self.mode_queue()
+        if modes != None and (modes.has_switch_timer(self, name) or modes.scheduler.is_delayed(self, name)):
+            return True
+        return super(JDMode, self).is_delayed(name)
+
+
+class DelayTracking(object):
+    """A mixin for the procgame modes that can't derive from JDMode, like Trough and BallSave.
+       It records the names of the handlers the mode delays so JDModeQueue.teardown() can cancel
+       them with cancel_delayed(). Put it first in the bases so it wraps Mode.delay.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.delayed_names = set()
+        super(DelayTracking, self).__init__(*args, **kwargs)
+
+    def delay(self, name, event_type, delay, handler, param=None):
+        self.delayed_names.add(name)
+        super(DelayTracking, self).delay(name, event_type, delay, handler, param)
+
+
+class JDModeQueue(ModeQueue):
+    """A ModeQueue that indexes the handlers of its modes.
+       The index is cleared when a mode is added or removed or when a JDMode adds a switch handler
+       or an event handler, and each entry is rebuilt on first use. An event handler assigned to a mode
+       that is not a JDMode while it is in the queue is only seen after the next change of the queue.
+
+       The pending sw_<name>_<state>_for_<time> handlers of all the modes are kept in one timing wheel
+       and the handlers delayed by JDMode.delay() in one DelayScheduler, rather than in each mode.
+
+       remove() takes a mode out of the queue, its delayed handlers run when it is added again.
+       teardown() also cancels everything the mode left pending.
+    """
+
+    # seconds per tick of the timing wheel of the switch handlers
+    switch_timer_resolution = 0.005
+
+    def __init__(self, game):
+        super(JDModeQueue, self).__init__(game)
+        self.event_handlers = {} # event name -> bound handlers of the modes in priority order
+        self.switch_modes = {} # switch number -> (mode, switch handlers or None) in priority order
+        self.switch_timers = TimingWheel(self.switch_timer_resolution, time.time())
+        self.pending_switch_timers = {} # mode -> {switch handler: timer}
+        self.scheduler = DelayScheduler(self)
+        self.torn_down = WeakSet()
+        self.logger = logging.getLogger('game.mode')
+
+    def add(self, mode):
+        # clear the index before mode_started() is called, it might send events
+        self.invalidate()
+        self.torn_down.discard(mode)
+        super(JDModeQueue, self).add(mode)
+        # the handlers that expired while the mode was out of the queue run on the next tick
+        self.scheduler.mode_added(mode)
+
+    def remove(self, mode):
+        self.invalidate()
+        # a removed mode doesn't see the switch changing state, its pending handlers would fire late
+        for timer in self.pending_switch_timers.pop(mode, {}).values():
+            self.switch_timers.cancel(timer)
+        super(JDModeQueue, self).remove(mode)
+
+    def teardown(self, mode):
+        """remove the mode if it is in the queue, and cancel its delayed handlers and its pending timed switch
+           handlers, the handlers delayed by mode_stopped() included. The modes that install hardware rules,
+           like Multiball and Deadworld, remove them in mode_stopped(), which remove() calls.
+           The handlers delayed by a mode that is neither a JDMode nor a DelayTracking mode are not cancelled,
+           like with remove() they only run if the mode is added again.
+        """
+        self.remove(mode)
+        if isinstance(mode, JDMode):
+            self.scheduler.cancel_all(mode)
+            # the sw_<name>_<state>_for_<time> handlers delayed by Mode.handle_event when the mode overrides it
+            names = list(set(switch_handler.name for switch_handler in mode.switch_handlers))
+            if names:
+                Mode.cancel_delayed(mode, names)
+        elif isinstance(mode, DelayTracking):
+            # the procgame modes keep their delayed handlers in the mode itself
+            names, mode.delayed_names = list(mode.delayed_names), set()
+            if names:
+                mode.cancel_delayed(names)
+        self.torn_down.add(mode)
+        if __debug__:
+            self.report_leaks(mode)
+
+    def report_leaks(self, mode):
+        """log what still refers to a mode after its teardown"""
+        leaks = []
+        if mode in self.modes:
+            leaks.append('still in the mode queue')
+        dmd = getattr(self.game, 'dmd', None)
+        for kind, handlers in [('score listener', getattr(self.game, 'score_listeners', [])),
+                               ('dmd frame handler', dmd.frame_handlers if dmd != None else [])]:
+            leaks.extend('%s %s' % (kind, handler.__name__) for handler in handlers if getattr(handler, '__self__', None) is mode)
+        if leaks:
+            self.logger.warning('%s leaked after its teardown: %s', type(mode).__name__, ', '.join(leaks))
+
+    def invalidate(self):
+        self.event_handlers = {}
+        self.switch_modes = {}
+
+    def tick(self):
+        now = time.time()
+        self.scheduler.dispatch(now)
+        super(JDModeQueue, self).tick()
+        self.switch_timers.advance(now)
+
+    def handle_event(self, event):
+        """pass a switch event to the modes handling that switch by priority, until one of them handles it"""
+        entries = self.switch_modes.get(event['value'])
+        if entries is None:
+            entries = self.modes_handling(self.game.switches[event['value']].name)
+            self.switch_modes[event['value']] = entries
+        # like the modes list copied by ModeQueue, the list is replaced rather than modified
+        for mode, switch_handlers in entries:
+            if switch_handlers is None:
+                handled = mode.handle_event(event)
+            else:
+                handled = self.handle_switch(mode, switch_handlers, event)
+            if handled:
+                break
+
+    def modes_handling(self, switch_name):
+        """return the modes of the queue that must see the events of the switch, with their handlers of the switch.
+           The index is per switch rather than per state, a pending sw_<name>_<state>_for_<time> handler
+           is cancelled when the switch changes to the other state.
+           A mode that is not a JDMode or that overrides handle_event is returned without handlers, it gets every event.
+        """
+        entries = []
+        for mode in self.modes:
+            if not isinstance(mode, JDMode) or 'handle_event' in mode.__dict__ or any('handle_event' in cls.__dict__ for cls in type(mode).__mro__ if cls is not Mode):
+                entries.append((mode, None))
+                continue
+            switch_handlers = [switch_handler for switch_handler in mode.switch_handlers if switch_handler.name == switch_name]
+            if switch_handlers:
+                entries.append((mode, switch_handlers))
+        return entries
+
+    def handle_switch(self, mode, switch_handlers, event):
+        """Mode.handle_event with the delayed handlers in the timing wheel, return True if the event is handled"""
+        closed = event['type'] in closed_event_types
+        pending = self.pending_switch_timers.get(mode)
+        if pending:
+            for switch_handler, timer in list(pending.items()):
+                if switch_handler.name == switch_handlers[0].name and switch_handler.closed != closed:
+                    self.switch_timers.cancel(timer)
+                    del pending[switch_handler]
+
+        handled = False
+        for switch_handler in switch_handlers:
+            if switch_handler.closed != closed:
+                continue
+            if switch_handler.delay == None:
+                if switch_handler.handler(switch_handler.param) == SwitchStop:
+                    handled = True
+            else:
+                pending = self.pending_switch_timers.setdefault(mode, {})
+                if switch_handler in pending:
+                    # the switch didn't change state since the handler was armed
+                    self.switch_timers.cancel(pending[switch_handler])
+                pending[switch_handler] = self.switch_timers.arm(switch_handler.delay, time.time(), self.switch_timer_expired, (mode, switch_handler))
+        return handled
+
+    def cancel_switch_timers(self, mode, name):
+        """cancel the pending timed handlers of the mode for the switch name, or for any name of a list"""
+        pending = self.pending_switch_timers.get(mode)
+        if pending:
+            names = name if isinstance(name, list) else [name]
+            for switch_handler, timer in list(pending.items()):
+                if switch_handler.name in names:
+                    self.switch_timers.cancel(timer)
+                    del pending[switch_handler]
+
+    def has_switch_timer(self, mode, name):
+        return any(switch_handler.name == name for switch_handler in self.pending_switch_timers.get(mode, {}))
+
+    def switch_timer_expired(self, param):
+        mode, switch_handler = param
+        del self.pending_switch_timers[mode][switch_handler]
+        switch_handler.handler(switch_handler.param)
+
+    def send_event(self, event):
+        """call the handler of the event in each mode by priority until one returns a true value, return that value"""
+        handlers = self.event_handlers.get(event)
+        if handlers is None:
+            handlers = [handler for handler in (getattr(mode, event, None) for mode in self.modes) if handler]
+            self.event_handlers[event] = handlers
+        # the list is not modified when a handler adds or removes modes, a new list replaces it
+        for handler in handlers:
+            ret = handler()
+            if ret:
+                # skip lower priority modes
+                return ret
+
@@ -1,7 +1,7 @@
 from random import shuffle
-from procgame.dmd import FrameLayer, GroupedLayer, MarkupFrameGenerator, PanningLayer, PushTransition, ScriptedLayer, TextLayer
+from procgame.dmd import FrameLayer, MarkupFrameGenerator, PanningLayer, PushTransition, ScriptedLayer
 from procgame.highscore import generate_highscore_frames
-from layers import FastPanningLayer
+from layers import FastPanningLayer, GroupedLayer, TextLayer
 from tilt import CoilEjectMode
 
 class Attract(CoilEjectMode):
@@ -61,8 +61,6 @@ class Attract(CoilEjectMode):
 """)
 
         self.credits_layer = FastPanningLayer(width=128, height=32, frame=credits_frame, origin=(0, 0), translate=(0, 1), bounce=False)
-        self.judges_layer = self.game.animations['darkjudges']
-        self.longwalk_layer = self.game.animations['longwalk']
 
         instruct_frame = MarkupFrameGenerator().frame_for_markup("""
 
@@ -141,7 +139,7 @@ Collect a multiball jackpot
             {'seconds':3.0, 'layer':self.proc_splash_layer},
             {'seconds':7.0, 'layer':self.credits_layer},
             {'seconds':2.5, 'layer':self.game.score_display.layer},
-            {'seconds':3.0, 'layer':self.judges_layer},
+            {'seconds':3.0, 'layer':self.game.animations['darkjudges']},
         ]
 
         self.append_high_score_layers(script)
@@ -153,7 +151,7 @@ Collect a multiball jackpot
         self.game.score_display.update_layer()
 
         script = [
-            {'seconds':3.4, 'layer':self.longwalk_layer}, # stop this anim early, Game Over font does not fit rest of the game
+            {'seconds':3.4, 'layer':self.game.animations['longwalk']}, # stop this anim early, Game Over font does not fit rest of the game
             {'seconds':3.0, 'layer':self.game_over_layer},
             {'seconds':4.0, 'layer':self.game.score_display.layer},
         ]
@@ -1,6 +1,7 @@
 from procgame.modes import BallSearch
+from mode_queue import DelayTracking
 
-class JDBallSearch(BallSearch):
+class JDBallSearch(DelayTracking, BallSearch):
     """Search in the Deadworld planet if the first few rounds are unsuccessful.
        Unlock a ball or give a pitty ball if still unsuccessful after about 2min
     """
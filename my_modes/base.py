@@ -1,7 +1,8 @@
 from random import randint
-from procgame.dmd import AnimatedLayer, GroupedLayer, TextLayer
-from procgame.game import Mode
+from procgame.dmd import AnimatedLayer
 from procgame.modes import Replay
+from mode_queue import DelayTracking, JDMode
+from layers import GroupedLayer, TextLayer
 from boring import Boring
 from bonus import Bonus
 from challenge import UltimateChallenge
@@ -9,7 +10,7 @@ from combos import Combos
 from regular import RegularPlay
 from status import StatusReport
 
-class BasePlay(Mode):
+class BasePlay(JDMode):
     """Base rules for all the time the ball is in play"""
 
     def __init__(self, game, priority):
@@ -27,7 +28,7 @@ class BasePlay(Mode):
         self.ultimate_challenge = UltimateChallenge(game, priority + 5)
         self.ultimate_challenge.exit_callback = self.ultimate_challenge_ended
 
-        self.replay = Replay(self.game, priority + 15)
+        self.replay = JDReplay(self.game, priority + 15)
         self.replay.replay_callback = self.replay_callback
 
         self.bonus = Bonus(self.game, priority + 6)
@@ -433,7 +434,7 @@ class BasePlay(Mode):
         self.game.end_ball()
 
 
-class ModesDisplay(Mode):
+class ModesDisplay(JDMode):
     """Display some text when the ball is active"""
 
     def __init__(self, game, priority):
@@ -441,21 +442,24 @@ class ModesDisplay(Mode):
         self.large_text_layer = TextLayer(128/2, 7, self.game.fonts['large'], 'center')
         self.small_text_layer = TextLayer(128/2, 7, self.game.fonts['medium'], 'center')
         self.points_layer = TextLayer(128/2, 17, self.game.fonts['large_num'], 'center')
+        self.display_layer = GroupedLayer(128, 32, [self.large_text_layer, self.small_text_layer, self.points_layer])
 
     def display(self, text=None, points=None):
-        layers = []
-        if text:
-            text_layer = self.small_text_layer if points is not None else self.large_text_layer
-            text_layer.set_text(text, 3)
-            layers.append(text_layer)
-        if points is not None:
-            self.points_layer.set_text(self.game.format_points(points), 3)
-            layers.append(self.points_layer)
-        self.layer = GroupedLayer(128, 32, layers)
-
-
-class ModesAnimation(Mode):
+        # the layers are updated in place, a layer without text is hidden
+        text_layer = self.small_text_layer if points is not None else self.large_text_layer
+        for layer in [self.large_text_layer, self.small_text_layer]:
+            layer.set_text(text if text and layer is text_layer else None, 3)
+        self.points_layer.set_text(self.game.format_points(points) if points is not None else None, 3)
+        self.layer = self.display_layer if text or points is not None else None
+
+
+class ModesAnimation(JDMode):
     """Play an animation when the ball is active"""
 
     def play(self, anim, repeat=False, hold=False, frame_time=1):
         self.layer = AnimatedLayer(frames=anim.frames, repeat=repeat, hold=hold, frame_time=frame_time)
+
+
+class JDReplay(DelayTracking, Replay):
+    """The procgame Replay, its delayed handlers are cancelled when it is torn down"""
+    pass
@@ -1,10 +1,10 @@
 from random import shuffle
 from time import time
-from procgame.game import Mode
+from mode_queue import JDMode
 from crimescenes import CrimeSceneShots
 from timer import TimedMode
 
-class CityBlocks(Mode):
+class CityBlocks(JDMode):
     """Controls the progress through the city block modes"""
 
     def __init__(self, game, priority):
@@ -229,7 +229,7 @@ class BlockWar(TimedMode, CrimeSceneShots):
     """
 
     def __init__(self, parent, priority):
-        super(BlockWar, self).__init__(parent.game, priority, 0, 'Block War', 'Shoot all lit shots', 5, parent.game.animations['blockwars'])
+        super(BlockWar, self).__init__(parent.game, priority, 0, 'Block War', 'Shoot all lit shots', 5, 'blockwars')
         self.parent = parent
         # hide the mode name in the top left corner
         self.name_layer.set_text(None)
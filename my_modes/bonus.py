@@ -1,6 +1,6 @@
-from procgame.game import Mode
+from mode_queue import JDMode
 
-class Bonus(Mode):
+class Bonus(JDMode):
     """Display end of ball bonus"""
 
     def mode_started(self):
@@ -1,6 +1,6 @@
-from procgame.game import Mode
+from mode_queue import JDMode
 
-class Boring(Mode):
+class Boring(JDMode):
     """Taunt player if nothing happens for a while"""
 
     def __init__(self, game, priority):
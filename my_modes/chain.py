@@ -1,9 +1,9 @@
 from random import randint
 from time import time
-from procgame.game import Mode
+from mode_queue import JDMode
 from timer import TimedMode
 
-class Chain(Mode):
+class Chain(JDMode):
     """Controls the progress through the chain modes"""
 
     def __init__(self, game, priority):
@@ -1,10 +1,10 @@
 from random import shuffle
-from procgame.dmd import GroupedLayer, TextLayer
-from procgame.game import Mode
+from mode_queue import JDMode
+from layers import GroupedLayer, TextLayer
 from crimescenes import CrimeSceneShots
 from timer import TimedMode
 
-class UltimateChallenge(Mode):
+class UltimateChallenge(JDMode):
     """Wizard mode or start of supergame"""
 
     def __init__(self, game, priority):
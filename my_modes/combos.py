@@ -1,6 +1,6 @@
-from procgame.game import Mode
+from mode_queue import JDMode
 
-class Combos(Mode):
+class Combos(JDMode):
     """Award combos for repeated loop shots, the skill shot is an outer loop combo"""
 
     def mode_started(self):
@@ -1,6 +1,6 @@
-from procgame.game import Mode
+from mode_queue import JDMode
 
-class CrimeSceneShots(Mode):
+class CrimeSceneShots(JDMode):
     """Base class for modes using the crime scene shots"""
 
     def __init__(self, game, priority, *args, **kwargs):
@@ -1,8 +1,9 @@
-from procgame.dmd import GroupedLayer, TextLayer
-from procgame.game import Mode, SwitchStop
+from procgame.game import SwitchStop
 from procgame.service import ServiceModeSkeleton
+from mode_queue import DelayTracking, JDMode
+from layers import GroupedLayer, TextLayer
 
-class Deadworld(Mode):
+class Deadworld(JDMode):
     """Controls the Deadworld planet"""
 
     def __init__(self, game, priority):
@@ -150,7 +151,7 @@ class Deadworld(Mode):
             else:
                 self.stop_spinning()
 
-class DeadworldTest(ServiceModeSkeleton):
+class DeadworldTest(DelayTracking, ServiceModeSkeleton):
     """Test the Deadworld planet in service mode"""
 
     def __init__(self, game, priority, font):
@@ -1,7 +1,7 @@
-from procgame.game import Mode
+from mode_queue import JDMode
 from tilt import TiltMonitorMode
 
-class DrainMode(Mode):
+class DrainMode(JDMode):
     """Monitor drains to determine when the ball has ended.
        This mode waits for balls to drain when the player has tilted,
        therefore it must not affect the score or lamps.
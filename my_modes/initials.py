@@ -1,11 +1,13 @@
 # Originally copied from pyprocgame
 # Copyright (c) 2009-2011 Adam Preble and Gerry Stellenberg
 
-from procgame.game import Mode, SwitchStop
-from procgame.dmd import Frame, FrameLayer, FrameQueueLayer, GroupedLayer, ScriptedLayer, font_named
+from procgame.game import SwitchStop
+from procgame.dmd import Frame, FrameLayer, FrameQueueLayer, ScriptedLayer, font_named
 from procgame.highscore import CategoryLogic, EntrySequenceManager
+from mode_queue import DelayTracking, JDMode
+from layers import GroupedLayer
 
-class JDEntrySequenceManager(EntrySequenceManager):
+class JDEntrySequenceManager(DelayTracking, EntrySequenceManager):
 
     def __init__(self, game, priority, categories):
         super(JDEntrySequenceManager, self).__init__(game, priority)
@@ -15,7 +17,7 @@ class JDEntrySequenceManager(EntrySequenceManager):
         return JDInitialEntryMode(game=self.game, priority=self.priority+1, left_text=left_text, right_text=right_text, entered_handler=entered_handler)
 
 
-class JDInitialEntryMode(Mode):
+class JDInitialEntryMode(JDMode):
     """Mode that prompts the player for their initials.
 
     *left_text* and *right_text* are strings or arrays to be displayed at the
@@ -79,10 +81,9 @@ class JDInitialEntryMode(Mode):
         topthird_right_layer.composite_op = 'blacksrc'
         self.layer.layers += [topthird_right_layer]
 
-        self.inits_frame = Frame(width=128, height=10)
-        inits_layer = FrameLayer(opaque=False, frame=self.inits_frame)
-        inits_layer.set_target_position(0, 10)
-        self.layer.layers += [inits_layer]
+        self.inits_layer = FrameLayer(opaque=False, frame=Frame(width=128, height=10))
+        self.inits_layer.set_target_position(0, 10)
+        self.layer.layers += [self.inits_layer]
 
         self.lowerhalf_layer = FrameQueueLayer(opaque=False, hold=True)
         self.lowerhalf_layer.set_target_position(0, 23)
@@ -140,16 +141,18 @@ class JDInitialEntryMode(Mode):
 
     def draw_initials(self):
         # Draw the middle panel, with the selected initials in order
-        self.inits_frame.clear()
+        # draw on a new frame, the compositor assumes the frame of a FrameLayer is not modified in place
+        inits_frame = Frame(width=128, height=10)
         init_spread = 8
-        x_offset = -3 + self.inits_frame.width/2 - len(self.initials) * init_spread / 2
+        x_offset = -3 + inits_frame.width/2 - len(self.initials) * init_spread / 2
         if len(self.initials) == self.max_length:
             # recenter since we do not display the blinking cursor
             x_offset += init_spread / 2
         elif self.cursor_visible:
-            self.inits_frame.fill_rect(len(self.initials) * init_spread + x_offset, 9, 8, 1, 15)
+            inits_frame.fill_rect(len(self.initials) * init_spread + x_offset, 9, 8, 1, 15)
         for x in range(len(self.initials)):
-            self.init_font.draw(self.inits_frame, self.initials[x], x * init_spread + x_offset, 0)
+            self.init_font.draw(inits_frame, self.initials[x], x * init_spread + x_offset, 0)
+        self.inits_layer.frame = inits_frame
 
     def blink_cursor(self):
         self.cursor_visible = not self.cursor_visible
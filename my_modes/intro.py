@@ -1,6 +1,6 @@
-from procgame.game import Mode
+from mode_queue import JDMode
 
-class Introduction(Mode):
+class Introduction(JDMode):
     """Display instructions for a mode"""
 
     def __init__(self, game, priority):
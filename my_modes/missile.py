@@ -1,5 +1,5 @@
 from random import randint
-from procgame.dmd import GroupedLayer, TextLayer
+from layers import GroupedLayer, TextLayer
 from timer import Timer
 from videomode import ShootingGallery
 
@@ -1,7 +1,7 @@
-from procgame.game import Mode
 from procgame.modes import BasicDropTargetBank
+from mode_queue import DelayTracking, JDMode
 
-class Multiball(Mode):
+class Multiball(JDMode):
     """3-ball Multiball activated by locking balls in the Deadworld planet"""
 
     def __init__(self, game, priority):
@@ -10,7 +10,7 @@ class Multiball(Mode):
         self.deadworld_mod_installed = self.game.user_settings['Machine']['Deadworld mod installed']
         self.ball_save_time = self.game.user_settings['Gameplay']['Multiball ballsave time']
 
-        self.drops = BasicDropTargetBank(self.game, priority=priority + 1, prefix='dropTarget', letters='JUDGE')
+        self.drops = JDDropTargetBank(self.game, priority=priority + 1, prefix='dropTarget', letters='JUDGE')
         self.drops.on_advance = self.on_drops_advance
         self.drops.on_completed = self.on_drops_completed
         self.drops.auto_reset = False
@@ -270,3 +270,8 @@ class Multiball(Mode):
 
         style = 'slow' if self.jackpot_lit else 'off'
         self.game.drive_lamp('multiballJackpot', style)
+
+
+class JDDropTargetBank(DelayTracking, BasicDropTargetBank):
+    """The procgame BasicDropTargetBank, its delayed handlers are cancelled when it is torn down"""
+    pass
@@ -1,10 +1,10 @@
-from procgame.game import Mode
+from mode_queue import JDMode
 from chain import Chain
 from blocks import CityBlocks
 from multiball import Multiball
 from missile import MissileAwardMode
 
-class RegularPlay(Mode):
+class RegularPlay(JDMode):
     """Controls all play except ultimate challenge"""
 
     def __init__(self, game, priority):
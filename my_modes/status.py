@@ -1,6 +1,6 @@
-from procgame.game import Mode
+from mode_queue import JDMode
 
-class StatusReport(Mode):
+class StatusReport(JDMode):
     """Display status report"""
 
     def mode_started(self):
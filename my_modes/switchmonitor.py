@@ -1,7 +1,8 @@
-from procgame.game import Mode, SwitchStop, SwitchContinue
+from procgame.game import SwitchStop, SwitchContinue
 from procgame.highscore import EntrySequenceManager
+from mode_queue import JDMode
 
-class SwitchMonitor(Mode):
+class SwitchMonitor(JDMode):
     """A mode that monitors for specific switches and helps advance state as appropriate"""
 
     def __init__(self, game, priority):
@@ -2,10 +2,10 @@
 # Copyright (c) 2014-2015 Michael Ocean and Josh Kugler
 
 import time
-from procgame.dmd import GroupedLayer, TextLayer
-from procgame.game import Mode
+from mode_queue import JDMode
+from layers import GroupedLayer, TextLayer
 
-class CoilEjectMode(Mode):
+class CoilEjectMode(JDMode):
     # Eject any balls that get stuck before returning to the trough.
     def sw_popperL_active_for_300ms(self, sw):
         self.game.coils.popperL.pulse(40)
@@ -42,7 +42,7 @@ class Tilted(CoilEjectMode):
             self.delay(name='eject_balls', event_type=None, delay=delay, handler=self.eject_balls, param=switch_names[1:])
 
 
-class SlamTilted(Mode):
+class SlamTilted(JDMode):
     """Display 'Slam Tilt' and wait a little while before resetting the game"""
 
     def __init__(self, game, priority):
@@ -57,7 +57,7 @@ class SlamTilted(Mode):
         self.game.update_lamps()
 
 
-class TiltMonitorMode(Mode):
+class TiltMonitorMode(JDMode):
     """Monitor tilt warnings and slam tilt"""
 
     def __init__(self, game, priority, tilt_sw=None, slam_tilt_sw=None, num_tilt_warnings=2):
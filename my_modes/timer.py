@@ -1,8 +1,9 @@
-from procgame.dmd import GroupedLayer, ScriptedLayer, TextLayer
-from procgame.game import Mode
+from procgame.dmd import ScriptedLayer
+from mode_queue import JDMode
+from layers import GroupedLayer, TextLayer
 from intro import Introduction
 
-class Timer(Mode):
+class Timer(JDMode):
     """timer for a timed mode"""
 
     def __init__(self, game, priority):
@@ -57,11 +58,12 @@ class TimedMode(Timer):
     """Base class for timed modes, start with an intro showing instructions,
     then display the number of shots with a countdown timer"""
 
-    def __init__(self, game, priority, mode_time, name, instructions, num_shots_required, animationLayer=None):
+    def __init__(self, game, priority, mode_time, name, instructions, num_shots_required, animation=None):
         super(TimedMode, self).__init__(game, priority)
         self.mode_time = mode_time
         self.name = name
         self.num_shots_required = num_shots_required
+        self.animation = animation
 
         font_large = self.game.fonts['large']
         font_small = self.game.fonts['tiny']
@@ -81,21 +83,26 @@ class TimedMode(Timer):
         self.name_layer = TextLayer(1, 1, font_small, 'left').set_text(name)
         self.score_layer = TextLayer(128/2, 10, font_num, 'center')
         self.status_layer = TextLayer(128/2, 26, font_small, 'center')
-        layers = [animationLayer] if animationLayer else []
-        layers += [self.countdown_layer, self.name_layer, self.score_layer, self.status_layer]
-        self.mode_layer = GroupedLayer(128, 32, layers)
+        self.text_layers = [self.countdown_layer, self.name_layer, self.score_layer, self.status_layer]
+        self.mode_layer = GroupedLayer(128, 32, self.text_layers)
 
     def mode_started(self):
         self.game.modes.add(self.intro)
         self.num_shots = 0
         self.play_music()
+        self.game.score_listeners.append(self.update_score)
+        self.update_score()
 
     def mode_stopped(self):
+        self.game.score_listeners.remove(self.update_score)
         self.game.remove_modes([self.intro])
         self.stop_timer()
 
     def intro_ended(self):
         self.game.remove_modes([self.intro])
+        if self.animation:
+            # the animation is looked up when needed since it could have been unloaded
+            self.mode_layer.layers = [self.game.animations[self.animation]] + self.text_layers
         self.layer = self.mode_layer
         if self.mode_time > 0:
             self.start_timer(self.mode_time)
@@ -123,7 +130,8 @@ class TimedMode(Timer):
             status = 'Shots made: ' + str(self.num_shots) + '/' + str(self.num_shots_required)
         self.status_layer.set_text(status)
 
-    def mode_tick(self):
+    def update_score(self):
+        # called when the score changes, not on every tick
         score = self.game.current_player().score
         text = self.game.format_points(score)
         self.score_layer.set_text(text)
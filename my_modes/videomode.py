@@ -1,26 +1,34 @@
 from random import randint, shuffle
-from procgame.dmd import ExpandTransition, Frame, FrameLayer, GroupedLayer, ScriptedLayer, TextLayer
-from procgame.game import Mode, SwitchStop
+from procgame.dmd import ExpandTransition, Frame, FrameLayer, ScriptedLayer
+from procgame.game import SwitchStop
+from mode_queue import JDMode
+from layers import GroupedLayer, TextLayer
 
-class ShootingGallery(Mode):
+class ShootingGallery(JDMode):
     def __init__(self, game, priority, video_mode_setting):
         super(ShootingGallery, self).__init__(game, priority)
         self.on_complete = None
+        self.video_mode_setting = video_mode_setting
 
         if video_mode_setting == 'cow':
             # family friendly option
             self.enemy_text = 'Shoot mean cows'
             self.friend_text = 'Do NOT shoot nice cows'
             self.bad_guy_shot = 'moo'
-            cows_anim = self.game.animations['cows']
-            image_frames = cows_anim.frames[0].create_frames_from_grid(2, 1)
-            self.all_friends = [image_frames[0]] * 4
-            self.all_enemies = [image_frames[1]] * 4
         else:
             # default option
             self.enemy_text = 'Shoot enemies'
             self.friend_text = 'Do NOT shoot friends'
             self.bad_guy_shot = 'bad guy shot'
+
+    def load_frames(self):
+        # the animations are only loaded when the video mode is played
+        if self.video_mode_setting == 'cow':
+            cows_anim = self.game.animations['cows']
+            image_frames = cows_anim.frames[0].create_frames_from_grid(2, 1)
+            self.all_friends = [image_frames[0]] * 4
+            self.all_enemies = [image_frames[1]] * 4
+        else:
             gallery_anim = self.game.animations['jdpeople']
             image_frames = gallery_anim.frames[0].create_frames_from_grid(6, 2)
             self.all_enemies = image_frames[0:6]
@@ -30,6 +38,7 @@ class ShootingGallery(Mode):
         self.shot_frames = self.game.animations['scopeandshot'].frames[4:8]
 
     def mode_started(self):
+        self.load_frames()
         self.success = False
         self.state = 'intro'
         self.scope_pos = 0
@@ -0,0 +1,195 @@
+import logging
+import os
+from collections import OrderedDict
+import pygame
+from procgame.config import value_for_key_path
+from procgame.sound import SoundController
+
+def sound_size(sound):
+    """approximate number of bytes held by a decoded sound"""
+    if sound is None or not pygame.mixer.get_init():
+        return 0
+    frequency, sample_format, channels = pygame.mixer.get_init()
+    return int(sound.get_length() * frequency) * channels * (abs(sample_format) // 8)
+
+
+class SoundCache(object):
+    """Decoded sounds keyed by the real path of their file.
+       A file registered under several keys is decoded once and the Sound object is shared by every key,
+       each key plays it through its own SharedSound.
+    """
+
+    def __init__(self, decode):
+        self.decode = decode
+        self.sounds = {} # real path -> Sound, or None when the file could not be decoded
+        self.keys = {} # real path -> keys sharing the sound
+        self.logger = logging.getLogger('game.assets')
+
+    def real_path(self, path):
+        return os.path.realpath(path)
+
+    def load(self, path):
+        """return the sound for the file at path, decode it if it is not cached yet.
+           The same file must not be loaded concurrently, the asset loader submits each file once.
+        """
+        real_path = self.real_path(path)
+        if real_path not in self.sounds:
+            self.sounds[real_path] = self.decode(path)
+        return self.sounds[real_path]
+
+    def share(self, key, path):
+        """return the sound for the file at path registered under key"""
+        self.keys.setdefault(self.real_path(path), []).append(key)
+        return self.load(path)
+
+    def memory_saved(self):
+        """bytes not allocated because the sounds are shared"""
+        return sum(sound_size(self.sounds.get(real_path)) * (len(keys) - 1) for real_path, keys in self.keys.items())
+
+    def log_stats(self):
+        shared = len([keys for keys in self.keys.values() if len(keys) > 1])
+        num_keys = sum(len(keys) for keys in self.keys.values())
+        self.logger.info('sound cache: %d files for %d keys, %d files shared, %d bytes saved',
+                         len(self.sounds), num_keys, shared, self.memory_saved())
+
+
+class JDSoundController(SoundController):
+    """A SoundController that can decode the voice clips when they are first played.
+       In lazy mode, a voice key only records the paths of its files. SoundController picks the variant to play
+       before the file is decoded, so only that variant is loaded. The decoded samples are kept in a LRU
+       bounded by a memory budget in bytes.
+       A sound played before the asset loader committed its tier is registered the same way.
+    """
+
+    def __init__(self, game):
+        super(JDSoundController, self).__init__(game)
+        self.lazy_voice = value_for_key_path('voice_storage', 'memory') == 'lazy'
+        self.voice_memory_budget = value_for_key_path('voice_memory_budget', 8 * 1024 * 1024)
+        self.decoded = OrderedDict() # real path -> Sound, least recently used first
+        self.sizes = {}
+        self.memory = 0
+        self.logger = logging.getLogger('game.sound')
+
+    def play(self, key, *args, **kwargs):
+        self.register_early(key)
+        return super(JDSoundController, self).play(key, *args, **kwargs)
+
+    def play_voice(self, key, *args, **kwargs):
+        self.register_early(key)
+        return super(JDSoundController, self).play_voice(key, *args, **kwargs)
+
+    def register_early(self, key):
+        """register a sound whose tier is still loading in the background, rather than not playing it"""
+        asset_loader = getattr(self.game, 'asset_loader', None)
+        if self.enabled and key not in self.sounds and asset_loader != None:
+            asset_loader.register_early_sound(key)
+
+    def register_shared_sound(self, key, path, sound):
+        """register a sound decoded by the SoundCache, sound is None if it could not be decoded"""
+        if sound is None or not self.enabled:
+            # let SoundController check and log the error
+            self.register_sound(key, path)
+            return
+        self.logger.info('Registering sound - key: %s, file: %s', key, path)
+        self.sounds.setdefault(key, []).append(SharedSound(sound, self.volume))
+
+    def register_lazy_sound(self, key, path):
+        """register a sound that is decoded when it is first played"""
+        if not (self.enabled and pygame.mixer and pygame.mixer.get_init() and os.path.isfile(path)):
+            # let SoundController log the error
+            self.register_sound(key, path)
+            return
+        self.sounds.setdefault(key, []).append(LazySound(self, path, self.volume))
+
+    def decode(self, lazy_sound):
+        sound = self.decoded.pop(lazy_sound.real_path, None)
+        if sound is None:
+            self.logger.info('decoding %s', lazy_sound.path)
+            sound = pygame.mixer.Sound(str(lazy_sound.path))
+            self.sizes[lazy_sound.real_path] = sound_size(sound)
+            self.memory += self.sizes[lazy_sound.real_path]
+        self.decoded[lazy_sound.real_path] = sound # most recently used
+        self.evict(keep=lazy_sound.real_path)
+        return sound
+
+    def evict(self, keep):
+        for real_path, sound in list(self.decoded.items()):
+            if self.memory <= self.voice_memory_budget:
+                break
+            # a sound that is playing cannot be freed
+            if real_path != keep and sound.get_num_channels() == 0:
+                del self.decoded[real_path]
+                self.memory -= self.sizes.pop(real_path)
+
+
+class SharedSound(object):
+    """A stand-in for a pygame Sound shared by several keys.
+       Sound.stop() stops the sound on every channel, so stopping one key would stop the others playing the same file.
+       stop() and fadeout() only stop the channels this key started and that still play its sound.
+    """
+
+    def __init__(self, sound, volume):
+        self.sound = sound
+        self.volume = volume
+        self.channels = []
+
+    def load(self):
+        """return the Sound to play"""
+        return self.sound
+
+    def decoded(self):
+        """return the Sound if it is decoded, without decoding it"""
+        return self.sound
+
+    def play(self, *args, **kwargs):
+        sound = self.load()
+        # the volume of the Sound is shared with the other keys
+        sound.set_volume(self.volume)
+        channel = sound.play(*args, **kwargs)
+        self.channels = self.playing_channels()
+        if channel != None:
+            self.channels.append(channel)
+        return channel
+
+    def playing_channels(self):
+        sound = self.decoded()
+        return [channel for channel in self.channels if sound and channel.get_busy() and channel.get_sound() is sound]
+
+    def get_length(self):
+        return self.load().get_length()
+
+    def set_volume(self, volume):
+        self.volume = volume
+
+    def get_volume(self):
+        return self.volume
+
+    def get_num_channels(self):
+        return len(self.playing_channels())
+
+    def stop(self):
+        for channel in self.playing_channels():
+            channel.stop()
+        self.channels = []
+
+    def fadeout(self, time):
+        for channel in self.playing_channels():
+            channel.fadeout(time)
+
+
+class LazySound(SharedSound):
+    """A stand-in for a pygame Sound that is decoded on first use by JDSoundController,
+       the decoded sample is shared with the other keys using the same file
+    """
+
+    def __init__(self, controller, path, volume):
+        super(LazySound, self).__init__(None, volume)
+        self.controller = controller
+        self.path = path
+        self.real_path = os.path.realpath(path)
+
+    def load(self):
+        return self.controller.decode(self)
+
+    def decoded(self):
+        return self.controller.decoded.get(self.real_path)
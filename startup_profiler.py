@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from procgame.game import Mode
+
+class StartupProfiler(object):
+    """Records the time spent in the nested sections of the game startup.
+       The report is written as JSON and as folded stacks, the input format of flamegraph.pl and speedscope.
+       Only the thread that called start() is recorded, sections entered on other threads are ignored.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.thread = None
+        self.start_time = 0
+        self.total = 0
+        self.stack = []
+        self.sections = []
+        self.patched = []
+        self.constructing = set()
+
+    def start(self):
+        self.enabled = True
+        self.thread = threading.current_thread()
+        self.start_time = time.time()
+        self.wrap_mode_constructors()
+
+    def stop(self):
+        self.enabled = False
+        self.total = time.time() - self.start_time
+        for cls, init in self.patched:
+            cls.__init__ = init
+        self.patched = []
+
+    @contextmanager
+    def section(self, name):
+        if not self.enabled or threading.current_thread() is not self.thread:
+            yield
+            return
+        section = {'name': name, 'stack': [s['name'] for s in self.stack] + [name], 'start': time.time() - self.start_time, 'children': 0.0}
+        self.stack.append(section)
+        try:
+            yield
+        finally:
+            self.stack.pop()
+            section['duration'] = time.time() - self.start_time - section['start']
+            section['self'] = section['duration'] - section.pop('children')
+            if self.stack:
+                self.stack[-1]['children'] += section['duration']
+            self.sections.append(section)
+
+    def wrap_mode_constructors(self):
+        """time the constructor of every Mode subclass imported so far"""
+        classes = []
+        pending = [Mode]
+        while pending:
+            cls = pending.pop()
+            classes.append(cls)
+            pending.extend(cls.__subclasses__())
+        for cls in classes:
+            if '__init__' in cls.__dict__:
+                self.patched.append((cls, cls.__init__))
+                cls.__init__ = self.timed_init(cls, cls.__init__)
+
+    def timed_init(self, cls, init):
+        profiler = self
+        def __init__(self, *args, **kwargs):
+            # the constructors of the base classes are part of the most derived one
+            if id(self) in profiler.constructing:
+                return init(self, *args, **kwargs)
+            profiler.constructing.add(id(self))
+            try:
+                with profiler.section(type(self).__name__):
+                    return init(self, *args, **kwargs)
+            finally:
+                profiler.constructing.discard(id(self))
+        return __init__
+
+    def write_json(self, path):
+        sections = sorted(self.sections, key=lambda s: s['start'])
+        with open(path, 'w') as f:
+            json.dump({'total': self.total, 'sections': sections}, f, indent=2)
+
+    def write_folded(self, path):
+        """write one line per stack with its self time in microseconds"""
+        stacks = {}
+        for section in self.sections:
+            key = ';'.join(section['stack'])
+            stacks[key] = stacks.get(key, 0) + int(section['self'] * 1000000)
+        with open(path, 'w') as f:
+            for key in sorted(stacks):
+                f.write('%s %d\n' % (key, stacks[key]))
+
+
+# the game code records its sections in this profiler, it does nothing until it is started
+profiler = StartupProfiler()
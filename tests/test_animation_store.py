@@ -0,0 +1,72 @@
+import unittest
+
+try:
+    from procgame.dmd import Animation, Frame
+    from asset_loader import AnimationStore
+except ImportError:
+    AnimationStore = None
+
+@unittest.skipIf(AnimationStore is None, 'needs procgame')
+class AnimationStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        # room for two animations of one 128x32 frame
+        self.store = AnimationStore(2 * 128 * 32, self.decode)
+        self.decoded = []
+        for key in ['a', 'b', 'c', 'pinned']:
+            self.store.register({'key': key, 'file': key + '.dmd', 'pinned': key == 'pinned'}, key + '.dmd')
+
+    def decode(self, path):
+        self.decoded.append(path)
+        anim = Animation()
+        anim.frames = [Frame(128, 32)]
+        return anim
+
+    def loaded(self):
+        return sorted(key for key in self.store if self.store.is_loaded(key))
+
+    def test_load_on_first_access(self):
+        self.assertEqual(self.loaded(), [])
+        layer = self.store['a']
+        self.assertIs(self.store['a'], layer)
+        self.assertEqual(self.decoded, ['a.dmd'])
+        self.assertEqual(self.store.memory, 128 * 32)
+        self.assertRaises(KeyError, lambda: self.store['unknown'])
+        self.assertIsNone(self.store.get('unknown'))
+
+    def test_least_recently_used_is_evicted(self):
+        self.store['a']
+        self.store['b']
+        # a becomes the most recently used
+        self.store['a']
+        self.store['c']
+        self.assertEqual(self.loaded(), ['a', 'c'])
+        self.assertEqual(self.store.memory, self.store.budget)
+        # an evicted animation is decoded again
+        self.store['b']
+        self.assertEqual(self.loaded(), ['b', 'c'])
+        self.assertEqual(self.decoded, ['a.dmd', 'b.dmd', 'c.dmd', 'b.dmd'])
+
+    def test_pinned_is_never_evicted(self):
+        self.store['pinned']
+        self.store['a']
+        self.store['b']
+        self.store['c']
+        self.assertEqual(self.loaded(), ['c', 'pinned'])
+        # the animation just loaded stays even if the pinned ones fill the budget
+        self.store.budget = 128 * 32
+        self.store['a']
+        self.assertEqual(self.loaded(), ['a', 'pinned'])
+        self.assertEqual(self.store.memory, 2 * 128 * 32)
+
+    def test_add_replaces_a_loaded_animation(self):
+        self.store['a']
+        anim = Animation()
+        anim.frames = [Frame(128, 32), Frame(128, 32)]
+        layer = self.store.add('a', anim)
+        self.assertIs(self.store['a'], layer)
+        self.assertEqual(self.store.memory, 2 * 128 * 32)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,205 @@
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import mmap
+    from procgame.dmd import Animation, Frame
+    from procgame.game import Driver
+    from asset_bundle import AssetBundle, MappedFrames
+except ImportError:
+    AssetBundle = None
+
+class FakeGame(object):
+    def __init__(self):
+        self.lamps = {}
+        self.coils = {}
+
+
+def make_frame(width, height, value):
+    frame = Frame(width, height)
+    frame.fill_rect(0, 0, width, height, value)
+    return frame
+
+def make_animation(*values):
+    anim = Animation()
+    anim.width, anim.height = 4, 2
+    anim.frames = [make_frame(4, 2, value) for value in values]
+    return anim
+
+def dots(frames):
+    return [frame.get_data() for frame in frames]
+
+
+@unittest.skipIf(AssetBundle is None, 'needs procgame')
+class AssetBundleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.base_path = tempfile.mkdtemp()
+        self.bundle_path = os.path.join(self.base_path, 'assets.bundle')
+        self.game = FakeGame()
+        self.source = self.write_source('anim.dmd', 'source one')
+
+    def tearDown(self):
+        shutil.rmtree(self.base_path)
+
+    def write_source(self, name, content, mtime=1000000):
+        path = os.path.join(self.base_path, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def open_bundle(self):
+        return AssetBundle(self.bundle_path, self.base_path, self.game)
+
+    def save(self, path, asset):
+        bundle = self.open_bundle()
+        bundle.add(path, asset)
+        bundle.save()
+
+    def test_round_trip(self):
+        driver = Driver(self.game, 'drainShield', 1)
+        self.game.lamps['drainShield'] = driver
+        frames = [make_frame(4, 2, 3), make_frame(2, 2, 15)]
+        logger = logging.getLogger('game.test')
+        self.save(self.source, {'frames': frames, 'lamp': driver, 'logger': logger, 'game': self.game, 'name': 'anim'})
+
+        asset = self.open_bundle().load(self.source)
+        self.assertEqual([(frame.width, frame.height, frame.get_data()) for frame in asset['frames']],
+                         [(frame.width, frame.height, frame.get_data()) for frame in frames])
+        # the game objects are saved by reference
+        self.assertIs(asset['lamp'], driver)
+        self.assertIs(asset['logger'], logger)
+        self.assertIs(asset['game'], self.game)
+        self.assertEqual(asset['name'], 'anim')
+
+    def test_changed_size_is_stale(self):
+        self.save(self.source, 'one')
+        self.write_source('anim.dmd', 'source number two')
+        self.assertIsNone(self.open_bundle().load(self.source))
+
+    def test_changed_content_is_stale(self):
+        self.save(self.source, 'one')
+        # same size, new content and mtime
+        self.write_source('anim.dmd', 'source two', mtime=2000000)
+        self.assertIsNone(self.open_bundle().load(self.source))
+
+    def test_touched_file_is_fresh(self):
+        self.save(self.source, 'one')
+        self.write_source('anim.dmd', 'source one', mtime=2000000)
+        bundle = self.open_bundle()
+        self.assertEqual(bundle.load(self.source), 'one')
+        # the new mtime is remembered so the hash is skipped next time
+        self.assertTrue(bundle.changed())
+        bundle.save()
+        self.assertEqual(self.open_bundle().index['anim.dmd']['mtime'], 2000000)
+
+    def test_save_keeps_the_fresh_entries_only(self):
+        other = self.write_source('other.dmd', 'other')
+        bundle = self.open_bundle()
+        bundle.add(self.source, 'one')
+        bundle.add(other, 'other')
+        bundle.save()
+        self.write_source('other.dmd', 'other changed')
+        self.save(self.source, 'two')
+        bundle = self.open_bundle()
+        self.assertEqual(sorted(bundle.index), ['anim.dmd'])
+        self.assertEqual(bundle.load(self.source), 'two')
+
+    def test_other_version_is_ignored(self):
+        self.save(self.source, 'one')
+        version = AssetBundle.version
+        AssetBundle.version = version + 1
+        try:
+            self.assertIsNone(self.open_bundle().load(self.source))
+        finally:
+            AssetBundle.version = version
+
+    def test_unreadable_bundle_is_ignored(self):
+        with open(self.bundle_path, 'wb') as f:
+            f.write('JD2')
+        bundle = self.open_bundle()
+        self.assertEqual(bundle.index, {})
+        self.assertIsNone(bundle.load(self.source))
+
+
+@unittest.skipIf(AssetBundle is None, 'needs procgame')
+class MappedFramesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.base_path = tempfile.mkdtemp()
+        self.bundle_path = os.path.join(self.base_path, 'assets.bundle')
+        self.sources = {}
+        for name, content in [('one.dmd', 'one'), ('two.dmd', 'two')]:
+            path = os.path.join(self.base_path, name)
+            with open(path, 'wb') as f:
+                f.write(content)
+            self.sources[name] = path
+        self.bundle = AssetBundle(self.bundle_path, self.base_path, FakeGame())
+        self.bundle.add(self.sources['one.dmd'], make_animation(1, 2, 3))
+        self.bundle.add(self.sources['two.dmd'], make_animation(4, 5))
+        self.bundle.save()
+
+    def tearDown(self):
+        if self.bundle.map is not None:
+            self.bundle.map.close()
+        shutil.rmtree(self.base_path)
+
+    def test_frames_are_read_from_the_map(self):
+        anim = self.bundle.load_mapped(self.sources['one.dmd'])
+        self.assertIsInstance(anim.frames, MappedFrames)
+        self.assertEqual(len(anim.frames), 3)
+        self.assertEqual(dots(anim.frames), dots(make_animation(1, 2, 3).frames))
+        self.assertEqual(anim.frames[-1].get_data(), make_frame(4, 2, 3).get_data())
+        self.assertEqual(dots(anim.frames[1:]), dots(make_animation(2, 3).frames))
+        # only the frame accessed last is a copy
+        self.assertEqual(anim.frames.copied_size(), 8)
+
+    def test_map_is_opened_once(self):
+        one = self.bundle.load_mapped(self.sources['one.dmd'])
+        two = self.bundle.load_mapped(self.sources['two.dmd'])
+        self.assertIs(one.frames.mapping, two.frames.mapping)
+
+    def test_replaced_entry_keeps_its_frames(self):
+        one = self.bundle.load_mapped(self.sources['one.dmd'])
+        two = self.bundle.load_mapped(self.sources['two.dmd'])
+        self.bundle.add(self.sources['one.dmd'], make_animation(7))
+        self.bundle.save()
+        # the frames of the replaced entry were copied before the file was replaced
+        self.assertNotIsInstance(one.frames.mapping, mmap.mmap)
+        self.assertEqual(dots(one.frames), dots(make_animation(1, 2, 3).frames))
+        # the frames of the other entry read the new file, at the new offset of the entry
+        self.assertIs(two.frames.mapping, self.bundle.map)
+        self.assertEqual(dots(two.frames), dots(make_animation(4, 5).frames))
+        self.assertEqual(dots(self.bundle.load_mapped(self.sources['one.dmd']).frames), dots(make_animation(7).frames))
+
+    def test_dropped_entry_keeps_its_frames(self):
+        one = self.bundle.load_mapped(self.sources['one.dmd'])
+        with open(self.sources['one.dmd'], 'wb') as f:
+            f.write('one changed')
+        self.bundle.add(self.sources['two.dmd'], make_animation(6))
+        self.bundle.save()
+        self.assertNotIn('one.dmd', self.bundle.index)
+        self.assertEqual(dots(one.frames), dots(make_animation(1, 2, 3).frames))
+        self.assertIsNone(self.bundle.load_mapped(self.sources['one.dmd']))
+
+    def test_copied_frames_are_left_alone_by_the_next_save(self):
+        one = self.bundle.load_mapped(self.sources['one.dmd'])
+        two = self.bundle.load_mapped(self.sources['two.dmd'])
+        self.bundle.add(self.sources['one.dmd'], make_animation(7))
+        with open(self.sources['two.dmd'], 'wb') as f:
+            f.write('two changed')
+        self.bundle.save()
+        # one is replaced again and two is not in the index anymore
+        self.bundle.add(self.sources['one.dmd'], make_animation(8))
+        self.bundle.save()
+        self.assertEqual(dots(one.frames), dots(make_animation(1, 2, 3).frames))
+        self.assertEqual(dots(two.frames), dots(make_animation(4, 5).frames))
+        self.assertEqual(dots(self.bundle.load_mapped(self.sources['one.dmd']).frames), dots(make_animation(8).frames))
+
+
+if __name__ == '__main__':
+    unittest.main()
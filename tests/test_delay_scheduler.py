@@ -0,0 +1,102 @@
+import time
+import unittest
+from delay_scheduler import DelayScheduler
+
+class FakeMode(object):
+    pass
+
+
+class FakeModeQueue(object):
+    def __init__(self):
+        self.modes = []
+
+
+class DelaySchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = FakeModeQueue()
+        self.scheduler = DelayScheduler(self.queue)
+        self.mode = FakeMode()
+        self.other = FakeMode()
+        self.queue.modes = [self.mode, self.other]
+        self.calls = []
+
+    def dispatch_later(self, seconds=1):
+        self.scheduler.dispatch(time.time() + seconds)
+
+    def test_delay_and_cancel_during_dispatch(self):
+        def handler():
+            self.calls.append('handler')
+            # the other mode only has an incoming entry
+            self.scheduler.delay(self.other, 'tick', 0, lambda: self.calls.append('tick'))
+            self.scheduler.cancel(self.other, 'other')
+            # restart a timer of the same name
+            self.scheduler.cancel(self.mode, 'restart')
+            self.scheduler.delay(self.mode, 'restart', 0, lambda: self.calls.append('restart'))
+        self.scheduler.delay(self.mode, 'handler', 0, handler)
+        self.dispatch_later()
+        self.assertEqual(self.calls, ['handler'])
+        self.assertTrue(self.scheduler.is_delayed(self.other, 'tick'))
+        self.dispatch_later()
+        self.assertEqual(sorted(self.calls), ['handler', 'restart', 'tick'])
+        self.assertEqual(self.scheduler.count(self.mode), 0)
+        self.assertEqual(self.scheduler.count(self.other), 0)
+
+    def test_cancel_incoming(self):
+        def handler():
+            self.scheduler.delay(self.other, 'tick', 0, lambda: self.calls.append('tick'))
+            self.scheduler.cancel(self.other, 'tick')
+        self.scheduler.delay(self.mode, 'handler', 0, handler)
+        self.dispatch_later()
+        self.dispatch_later()
+        self.assertEqual(self.calls, [])
+        self.assertEqual(self.scheduler.num_cancelled, 0)
+        self.assertEqual(self.scheduler.heap, [])
+
+    def test_delay_and_cancel_after_cancel_all(self):
+        self.scheduler.delay(self.mode, 'old', 10, lambda: self.calls.append('old'))
+        self.scheduler.cancel_all(self.mode)
+        self.scheduler.cancel(self.mode, 'old')
+        self.scheduler.delay(self.mode, 'new', 0, lambda: self.calls.append('new'))
+        self.scheduler.cancel(self.mode, 'other')
+        self.dispatch_later(20)
+        self.assertEqual(self.calls, ['new'])
+        self.assertEqual(self.scheduler.count(self.mode), 0)
+
+    def test_cancel_all_during_dispatch(self):
+        def handler():
+            self.scheduler.delay(self.mode, 'old', 0, lambda: self.calls.append('old'))
+            self.scheduler.cancel_all(self.mode)
+            self.scheduler.delay(self.mode, 'incoming', 0, lambda: self.calls.append('incoming'))
+            self.scheduler.cancel(self.mode, 'other')
+        self.scheduler.delay(self.mode, 'handler', 0, handler)
+        self.dispatch_later()
+        self.dispatch_later()
+        self.assertEqual(self.calls, ['incoming'])
+        self.assertEqual(self.scheduler.count(self.mode), 0)
+
+    def test_parked_entries_run_when_the_mode_is_added(self):
+        self.scheduler.delay(self.mode, 'parked', 0, lambda: self.calls.append('parked'))
+        self.scheduler.delay(self.mode, 'cancelled', 0, lambda: self.calls.append('cancelled'))
+        self.queue.modes.remove(self.mode)
+        self.dispatch_later()
+        self.scheduler.cancel(self.mode, 'cancelled')
+        # the parked entries are not in the heap
+        self.assertEqual(self.scheduler.num_cancelled, 0)
+        self.queue.modes.append(self.mode)
+        self.scheduler.mode_added(self.mode)
+        self.dispatch_later()
+        self.assertEqual(self.calls, ['parked'])
+
+    def test_heap_is_rebuilt_when_half_is_cancelled(self):
+        for i in range(4):
+            self.scheduler.delay(self.mode, 'timer%d' % i, 10, lambda: None)
+        self.scheduler.cancel(self.mode, ['timer0', 'timer1'])
+        self.assertEqual(len(self.scheduler.heap), 4)
+        self.scheduler.cancel(self.mode, 'timer2')
+        self.assertEqual(len(self.scheduler.heap), 1)
+        self.assertEqual(self.scheduler.num_cancelled, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
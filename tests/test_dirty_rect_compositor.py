@@ -0,0 +1,127 @@
+import unittest
+
+try:
+    from procgame.dmd import Frame, FrameLayer, Layer
+    from compositor import Compositor, DirtyRectCompositor
+    from layers import GroupedLayer
+except ImportError:
+    DirtyRectCompositor = None
+
+def make_frame(width, height, value):
+    frame = Frame(width, height)
+    frame.fill_rect(0, 0, width, height, value)
+    return frame
+
+def make_layer(width, height, value, x=0, y=0, op='copy'):
+    layer = FrameLayer(frame=make_frame(width, height, value))
+    layer.set_target_position(x, y)
+    layer.composite_op = op
+    return layer
+
+
+if DirtyRectCompositor is not None:
+    class CountingLayer(Layer):
+        """a layer that returns a new frame on every call, its frames are not stable"""
+
+        def __init__(self):
+            super(CountingLayer, self).__init__()
+            self.count = 0
+
+        def next_frame(self):
+            self.count += 1
+            return make_frame(4, 4, self.count)
+
+
+@unittest.skipIf(DirtyRectCompositor is None, 'needs procgame')
+class DirtyRectCompositorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.compositor = DirtyRectCompositor(None)
+        self.background = make_layer(128, 32, 1)
+        self.sprite = make_layer(8, 8, 5, 10, 10)
+        self.layers = [self.background, self.sprite]
+
+    def assertComposedLike(self, frame, layers):
+        # the layers have stable frames, compositing them again gives the same frame
+        self.assertEqual(frame.get_data(), Compositor(None).compose(layers).get_data())
+
+    def test_unchanged_frame_is_reused(self):
+        first = self.compositor.compose(self.layers)
+        self.assertIs(self.compositor.compose(self.layers), first)
+        self.assertEqual((self.compositor.full, self.compositor.reused), (1, 1))
+
+    def test_changed_layer(self):
+        first = self.compositor.compose(self.layers)
+        first_data = first.get_data()
+        self.sprite.frame = make_frame(8, 8, 9)
+        frame = self.compositor.compose(self.layers)
+        self.assertComposedLike(frame, self.layers)
+        self.assertEqual((self.compositor.partial, self.compositor.dirty_dots), (1, 128 * 32 + 8 * 8))
+        # the previous frame might still be in use, it is not modified
+        self.assertEqual(first.get_data(), first_data)
+
+    def test_moved_layer(self):
+        self.compositor.compose(self.layers)
+        self.sprite.set_target_position(40, 20)
+        frame = self.compositor.compose(self.layers)
+        self.assertComposedLike(frame, self.layers)
+        self.assertEqual(frame.get_dot(10, 10), 1)
+        self.assertEqual(self.compositor.partial, 1)
+
+    def test_added_and_removed_layers(self):
+        self.compositor.compose([self.background])
+        frame = self.compositor.compose(self.layers)
+        self.assertComposedLike(frame, self.layers)
+        frame = self.compositor.compose([self.background])
+        self.assertComposedLike(frame, [self.background])
+        self.assertEqual(self.compositor.partial, 2)
+
+    def test_disabled_layer(self):
+        self.compositor.compose(self.layers)
+        self.sprite.enabled = False
+        frame = self.compositor.compose(self.layers)
+        self.assertComposedLike(frame, [self.background])
+
+    def test_composite_op_of_an_overlapping_layer(self):
+        overlay = make_layer(16, 16, 0, 4, 4, op='blacksrc')
+        overlay.frame.fill_rect(0, 0, 4, 4, 7)
+        layers = self.layers + [overlay]
+        self.compositor.compose(layers)
+        self.sprite.frame = make_frame(8, 8, 9)
+        frame = self.compositor.compose(layers)
+        self.assertComposedLike(frame, layers)
+        self.assertEqual(frame.get_dot(4, 4), 7)
+        self.assertEqual(frame.get_dot(12, 12), 9)
+
+    def test_unstable_layer_is_composited_every_frame(self):
+        counting = CountingLayer()
+        counting.set_target_position(100, 0)
+        layers = self.layers + [counting]
+        self.compositor.compose(layers)
+        frame = self.compositor.compose(layers)
+        self.assertEqual(frame.get_dot(100, 0), 2)
+        self.assertEqual(self.compositor.reused, 0)
+
+
+@unittest.skipIf(DirtyRectCompositor is None, 'needs procgame')
+class GroupedLayerTest(unittest.TestCase):
+
+    def test_opaque_layer_hides_the_layers_below(self):
+        below = CountingLayer()
+        top = make_layer(8, 8, 5)
+        top.opaque = True
+        group = GroupedLayer(8, 8, [below, top])
+        frame = group.next_frame()
+        self.assertEqual(below.count, 0)
+        self.assertEqual(frame.get_data(), top.frame.get_data())
+        # the cached frame is only reused while the same layers are visible
+        self.assertIs(group.next_frame(), frame)
+        top.opaque = False
+        top.composite_op = 'blacksrc'
+        top.frame = make_frame(8, 8, 0)
+        self.assertEqual(group.next_frame().get_dot(0, 0), 1)
+        self.assertEqual(below.count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+try:
+    import pinproc
+    from mode_queue import JDMode, JDModeQueue
+except ImportError:
+    JDModeQueue = None
+
+class FakeSwitch(object):
+    def __init__(self, name, number):
+        self.name = name
+        self.number = number
+        self.type = 'NO'
+
+
+class FakeGame(object):
+    def __init__(self):
+        switch = FakeSwitch('leftRampExit', 42)
+        # like AttrCollection, a switch is found by name or by number
+        self.switches = {switch.name: switch, switch.number: switch}
+        self.modes = JDModeQueue(self)
+
+
+if JDModeQueue is not None:
+    class StartedMode(JDMode):
+        """adds its handlers in mode_started(), while it is in the queue"""
+
+        def __init__(self, game, priority):
+            super(StartedMode, self).__init__(game, priority)
+            self.calls = []
+
+        def mode_started(self):
+            self.add_switch_handler(name='leftRampExit', event_type='active', delay=None, handler=self.ramp_exit)
+            self.evt_ball_started = lambda: 'started'
+
+        def ramp_exit(self, sw):
+            self.calls.append(sw.name)
+
+
+@unittest.skipIf(JDModeQueue is None, 'needs procgame')
+class JDModeQueueIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.game = FakeGame()
+        self.modes = self.game.modes
+
+    def ramp_exit_closed(self):
+        self.modes.handle_event({'type': pinproc.EventTypeSwitchClosedDebounced, 'value': 42})
+
+    def test_handlers_added_in_mode_started(self):
+        mode = StartedMode(self.game, 10)
+        # the index is built before the mode is added
+        self.assertIsNone(self.modes.send_event('evt_ball_started'))
+        self.ramp_exit_closed()
+        self.modes.add(mode)
+        self.assertEqual(self.modes.send_event('evt_ball_started'), 'started')
+        self.ramp_exit_closed()
+        self.assertEqual(mode.calls, ['leftRampExit'])
+
+    def test_event_handler_assigned_in_the_queue(self):
+        mode = JDMode(self.game, 10)
+        self.modes.add(mode)
+        self.assertIsNone(self.modes.send_event('evt_ball_drained'))
+        mode.evt_ball_drained = lambda: 'drained'
+        self.assertEqual(self.modes.send_event('evt_ball_drained'), 'drained')
+        del mode.evt_ball_drained
+        self.assertIsNone(self.modes.send_event('evt_ball_drained'))
+
+    def test_switch_handler_added_in_the_queue(self):
+        mode = JDMode(self.game, 10)
+        calls = []
+        self.modes.add(mode)
+        self.ramp_exit_closed()
+        mode.add_switch_handler(name='leftRampExit', event_type='closed', delay=None, handler=lambda sw: calls.append(sw.name))
+        self.ramp_exit_closed()
+        self.assertEqual(calls, ['leftRampExit'])
+
+
+if __name__ == '__main__':
+    unittest.main()
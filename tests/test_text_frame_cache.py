@@ -0,0 +1,66 @@
+import os
+import unittest
+
+try:
+    from procgame.dmd import Font
+    from layers import TextFrameCache, TextLayer, text_frame_cache
+except ImportError:
+    TextFrameCache = None
+
+font_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets', 'fonts', 'Font07x5.dmd')
+
+@unittest.skipIf(TextFrameCache is None, 'needs procgame')
+class TextFrameCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = TextFrameCache(2)
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.put('a', 1)
+        self.cache.put('b', 2)
+        # a becomes the most recently used
+        self.assertEqual(self.cache.get('a'), 1)
+        self.cache.put('c', 3)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.get('c'), 3)
+        self.assertEqual((self.cache.hits, self.cache.misses), (3, 1))
+
+    def test_put_replaces_an_entry(self):
+        self.cache.put('a', 1)
+        self.cache.put('a', 2)
+        self.assertEqual(self.cache.get('a'), 2)
+        self.assertEqual(len(self.cache.entries), 1)
+
+
+@unittest.skipIf(TextFrameCache is None, 'needs procgame')
+class TextLayerTest(unittest.TestCase):
+
+    def setUp(self):
+        text_frame_cache.clear()
+        self.font = Font(font_path)
+
+    def test_same_text_shares_the_frame(self):
+        layer = TextLayer(64, 10, self.font, 'center').set_text('JUDGE')
+        other = TextLayer(64, 10, self.font, 'center').set_text('JUDGE')
+        self.assertIs(other.frame, layer.frame)
+        self.assertEqual((other.target_x, other.target_y, other.target_x_offset), (layer.target_x, layer.target_y, layer.target_x_offset))
+
+    def test_position_is_part_of_the_key(self):
+        layer = TextLayer(64, 10, self.font, 'center').set_text('JUDGE')
+        other = TextLayer(10, 20, self.font, 'center').set_text('JUDGE')
+        self.assertEqual((other.target_x, other.target_y), (10, 20))
+        self.assertEqual((layer.target_x, layer.target_y), (64, 10))
+
+    def test_new_text_is_rendered(self):
+        layer = TextLayer(0, 0, self.font).set_text('JUDGE')
+        frame = layer.frame
+        layer.set_text('DREDD')
+        self.assertIsNot(layer.frame, frame)
+        self.assertNotEqual(layer.frame.get_data(), frame.get_data())
+        layer.set_text('JUDGE')
+        self.assertIs(layer.frame, frame)
+
+
+if __name__ == '__main__':
+    unittest.main()
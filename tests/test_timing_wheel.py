@@ -0,0 +1,143 @@
+import random
+import unittest
+from timing_wheel import TimingWheel
+
+class TimingWheelTest(unittest.TestCase):
+
+    def setUp(self):
+        # one second per tick so the ticks are the seconds
+        self.start = 1000
+        self.wheel = TimingWheel(1.0, self.start)
+        self.fired = []
+
+    def arm(self, delay, now=None):
+        now = self.start if now is None else now
+        return self.wheel.arm(delay, now, self.fired.append, delay)
+
+    def advance(self, seconds):
+        self.wheel.advance(self.start + seconds)
+
+    def test_fire_at_the_exact_tick(self):
+        self.arm(5)
+        self.advance(4)
+        self.assertEqual(self.fired, [])
+        self.advance(5)
+        self.assertEqual(self.fired, [5])
+        self.advance(10)
+        self.assertEqual(self.fired, [5])
+
+    def test_fractional_delay_rounds_up(self):
+        self.wheel.arm(0.5, self.start + 0.2, self.fired.append, 'timer')
+        self.advance(0.9)
+        self.assertEqual(self.fired, [])
+        self.advance(1)
+        self.assertEqual(self.fired, ['timer'])
+
+    def test_cancel(self):
+        timer = self.arm(5)
+        self.arm(6)
+        self.wheel.cancel(timer)
+        # cancelling twice is counted once
+        self.wheel.cancel(timer)
+        self.advance(10)
+        self.assertEqual(self.fired, [6])
+        self.assertEqual(self.wheel.stats(), {'armed': 2, 'cancelled': 1, 'fired': 1})
+        self.assertEqual(self.wheel.pending(), 0)
+
+    def test_cancel_after_fire_is_not_counted(self):
+        timer = self.arm(1)
+        self.advance(1)
+        self.wheel.cancel(timer)
+        self.assertEqual(self.wheel.stats(), {'armed': 1, 'cancelled': 0, 'fired': 1})
+
+    def test_cascade_across_levels(self):
+        # level 0 covers 256 ticks, level 1 covers 256 * 64 ticks
+        delays = [255, 256, 300, 16383, 16384, 20000]
+        for delay in delays:
+            self.arm(delay)
+        for delay in delays:
+            self.advance(delay - 1)
+            self.assertNotIn(delay, self.fired)
+            self.advance(delay)
+            self.assertEqual(self.fired[-1], delay)
+        self.assertEqual(self.fired, delays)
+
+    def test_cancel_after_cascade(self):
+        timer = self.arm(300)
+        # the timer moved down to level 0
+        self.advance(260)
+        self.wheel.cancel(timer)
+        self.advance(400)
+        self.assertEqual(self.fired, [])
+        self.assertEqual(self.wheel.pending(), 0)
+
+    def test_overflow_is_not_fired_early(self):
+        # a timer beyond the last level used to be clamped to it and fired early
+        delay = self.wheel.max_ticks + 100
+        self.arm(delay)
+        self.assertEqual(len(self.wheel.overflow), 1)
+        self.advance(self.wheel.max_ticks)
+        self.assertEqual(self.fired, [])
+        self.advance(delay - 1)
+        self.assertEqual(self.fired, [])
+        self.advance(delay)
+        self.assertEqual(self.fired, [delay])
+
+    def test_overflow_is_added_again(self):
+        delay = self.wheel.max_ticks + 100
+        timer = self.arm(delay)
+        self.advance(self.wheel.max_ticks)
+        # the timer is in range after a turn of the last level
+        self.assertEqual(self.wheel.overflow, set())
+        self.assertIsNot(timer.slot, None)
+        self.wheel.cancel(timer)
+        self.advance(delay)
+        self.assertEqual(self.fired, [])
+        self.assertEqual(self.wheel.stats(), {'armed': 1, 'cancelled': 1, 'fired': 0})
+
+    def test_arm_while_firing(self):
+        def handler(param):
+            self.fired.append(param)
+            if param == 'first':
+                # armed for the tick being processed, it fires on the next advance
+                self.wheel.arm(0, self.start + 1, self.fired.append, 'second')
+        self.wheel.arm(1, self.start, handler, 'first')
+        self.advance(1)
+        self.assertEqual(self.fired, ['first'])
+        self.advance(2)
+        self.assertEqual(self.fired, ['first', 'second'])
+
+    def test_idle_wheel_skips_ahead(self):
+        self.advance(100000)
+        self.arm(5, self.start + 100000)
+        self.advance(100004)
+        self.assertEqual(self.fired, [])
+        self.advance(100005)
+        self.assertEqual(self.fired, [5])
+
+    def test_never_early_never_late(self):
+        rng = random.Random(1)
+        expires = {}
+        timers = {}
+        for i in range(300):
+            delay = rng.choice([rng.randint(0, 300), rng.randint(0, 20000), rng.randint(0, 70000)])
+            timers[i] = self.wheel.arm(delay, self.start, self.fired.append, i)
+            expires[i] = delay
+        for i in rng.sample(sorted(expires), 30):
+            self.wheel.cancel(timers[i])
+            del expires[i]
+        now = 0
+        while len(self.fired) < len(expires):
+            now += rng.randint(1, 2000)
+            self.advance(now)
+            for i in self.fired:
+                self.assertLessEqual(expires[i], now)
+            for i in expires:
+                if expires[i] <= now:
+                    self.assertIn(i, self.fired)
+        self.assertEqual(sorted(self.fired), sorted(expires))
+        self.assertEqual(self.wheel.stats(), {'armed': 300, 'cancelled': 30, 'fired': 270})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+from math import ceil
+
+class Timer(object):
+    """A handler armed in a TimingWheel"""
+
+    def __init__(self, expires, handler, param):
+        self.expires = expires # tick
+        self.handler = handler
+        self.param = param
+        self.slot = None # the set holding the timer while it is pending
+
+
+class TimingWheel(object):
+    """A hierarchical timing wheel, like the timers of the Linux kernel.
+       Level 0 has one slot per tick for the next 256 ticks, each slot of the next levels covers a whole
+       turn of the level below. Arming and cancelling a timer adds it to or removes it from the set of its slot.
+       advance() visits one slot per elapsed tick, and at the end of a turn of a level, the timers of the next
+       slot of the level above are cascaded down. The timers beyond the last level wait in an overflow set,
+       they are added again at the end of each turn of the last level.
+    """
+
+    level_bits = [8, 6, 6]
+
+    def __init__(self, resolution, now):
+        self.resolution = resolution # seconds per tick
+        self.tick = self.tick_at(now) # next tick to process
+        self.levels = [[set() for i in range(1 << bits)] for bits in self.level_bits]
+        self.overflow = set()
+        self.max_ticks = (1 << sum(self.level_bits)) - 1
+        self.armed = 0
+        self.cancelled = 0
+        self.fired = 0
+
+    def tick_at(self, seconds):
+        return int(seconds / self.resolution)
+
+    def arm(self, delay, now, handler, param=None):
+        """call handler(param) once delay seconds have elapsed after now, return the Timer to cancel it"""
+        # round up, a timer never fires early
+        timer = Timer(int(ceil((now + delay) / self.resolution)), handler, param)
+        self.add(timer)
+        self.armed += 1
+        return timer
+
+    def add(self, timer):
+        ticks = max(timer.expires - self.tick, 0)
+        if ticks > self.max_ticks:
+            timer.slot = self.overflow
+            timer.slot.add(timer)
+            return
+        expires = self.tick + ticks
+        shift = 0
+        for level, bits in zip(self.levels, self.level_bits):
+            if ticks < 1 << (shift + bits):
+                break
+            shift += bits
+        timer.slot = level[(expires >> shift) & (len(level) - 1)]
+        timer.slot.add(timer)
+
+    def cancel(self, timer):
+        if timer.slot != None:
+            timer.slot.discard(timer)
+            timer.slot = None
+            self.cancelled += 1
+
+    def cascade(self, level_index):
+        """move the timers of the current slot of the level down, return the index of that slot"""
+        shift = sum(self.level_bits[:level_index])
+        level = self.levels[level_index]
+        index = (self.tick >> shift) & (len(level) - 1)
+        timers, level[index] = level[index], set()
+        for timer in timers:
+            self.add(timer)
+        return index
+
+    def advance(self, now):
+        """fire the timers expired by now"""
+        end = self.tick_at(now)
+        if self.pending() == 0:
+            # nothing to visit
+            self.tick = max(self.tick, end + 1)
+            return
+        while self.tick <= end:
+            # at the end of a turn of level 0, cascade level 1, and level 2 at the end of a turn of level 1
+            if self.tick & (len(self.levels[0]) - 1) == 0:
+                for level_index in range(1, len(self.levels)):
+                    if self.cascade(level_index) != 0:
+                        break
+                else:
+                    # at the end of a turn of the last level, the overflow timers might be in range
+                    timers, self.overflow = self.overflow, set()
+                    for timer in timers:
+                        self.add(timer)
+            slot = self.levels[0][self.tick & (len(self.levels[0]) - 1)]
+            self.tick += 1
+            while slot:
+                timer = slot.pop()
+                timer.slot = None
+                self.fired += 1
+                timer.handler(timer.param)
+
+    def pending(self):
+        return self.armed - self.cancelled - self.fired
+
+    def stats(self):
+        return {'armed': self.armed, 'cancelled': self.cancelled, 'fired': self.fired}